@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from urbanGuideBackend import settings
+
+# Account creation. Password hashing is the expensive part of a signup, so it
+# runs on a small dedicated pool: a signup burst then takes at most
+# MAX_WORKERS cores (hashlib releases the GIL while hashing) and is turned
+# away once MAX_PENDING hashes are waiting, instead of starving every other
+# request of CPU.
+
+
+class UsernameTaken(Exception):
+    pass
+
+
+class HashingBusy(Exception):
+    """
+    Raised when the hashing pool's queue is full or a hash took longer than TIMEOUT.
+    """
+
+
+class HashingPool:
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hashing')
+            return self._executor
+
+    def hash(self, password, timeout):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many registrations in progress")
+        try:
+            future = self._get_executor().submit(make_password, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError as e:
+            raise HashingBusy("Password hashing timed out") from e
+
+
+hashing_pool = HashingPool(settings.PASSWORD_HASHING['MAX_WORKERS'], settings.PASSWORD_HASHING['MAX_PENDING'])
+
+
+def register(username, email, password):
+    """
+    Creates the user with a single INSERT and returns it. Raises UsernameTaken
+    if the username exists and HashingBusy when the hashing pool is saturated.
+    """
+    hashed = hashing_pool.hash(password, settings.PASSWORD_HASHING['TIMEOUT'])
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email or ''),
+        password=hashed,
+    )
+    try:
+        # The unique username index does the existence check
+        with transaction.atomic():
+            user.save(force_insert=True)
+    except IntegrityError as e:
+        raise UsernameTaken("Username already exists.") from e
+    return user
@@ -3,4 +3,10 @@ from .models import *
 
 admin.site.register(Item)
 admin.site.register(UserProfile)
-admin.site.register(UserSchedule)
\ No newline at end of file
+admin.site.register(UserSchedule)
+admin.site.register(ScheduleVenue)
+admin.site.register(CachedEntry)
+
+admin.site.register(KnownPlace)
+admin.site.register(ItineraryTemplate)
+admin.site.register(RefreshTask)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class UrbanGuideConfig(AppConfig):
+    name = 'urbanGuideBackend'
+
+    def ready(self):
+        from urbanGuideBackend.authentication import connect_signals
+
+        connect_signals()
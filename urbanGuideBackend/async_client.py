@@ -0,0 +1,77 @@
+import asyncio
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+from urbanGuideBackend import settings
+
+# One pooled keep-alive client per event loop; httpx connections can't be
+# shared between loops. Under WSGI every async view runs on a loop of its own,
+# so entries are weak (dropped with their loop) and each client is closed
+# while its loop shuts down, see _close_with_loop.
+_clients = weakref.WeakKeyDictionary()
+_host_semaphores = weakref.WeakKeyDictionary()
+
+
+def _build_client():
+    options = settings.ASYNC_HTTP_CLIENT
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=options['MAX_CONNECTIONS'],
+            max_keepalive_connections=options['MAX_KEEPALIVE_CONNECTIONS'],
+            keepalive_expiry=options['KEEPALIVE_EXPIRY'],
+        ),
+        timeout=httpx.Timeout(options['READ_TIMEOUT'], connect=options['CONNECT_TIMEOUT']),
+    )
+
+
+async def _close_with_loop(client):
+    # Parked until asyncio.run (or the ASGI server) cancels the loop's remaining tasks on shutdown
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.create_future()
+    finally:
+        # The entries reference the loop through this task, so they must go for the loop to be freed
+        if _clients.get(loop, (None,))[0] is client:
+            del _clients[loop]
+            _host_semaphores.pop(loop, None)
+        await client.aclose()
+
+
+def get_client():
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None or entry[0].is_closed:
+        client = _build_client()
+        # The task is kept in the entry: the loop itself only holds weak references to tasks
+        entry = _clients[loop] = (client, loop.create_task(_close_with_loop(client)))
+    return entry[0]
+
+
+def _host_semaphore(url):
+    # httpx only limits connections globally, so cap in-flight requests per host here
+    semaphores = _host_semaphores.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc
+    semaphore = semaphores.get(host)
+    if semaphore is None:
+        semaphore = semaphores[host] = asyncio.Semaphore(settings.ASYNC_HTTP_CLIENT['MAX_CONNECTIONS_PER_HOST'])
+    return semaphore
+
+
+async def get(url, params=None):
+    async with _host_semaphore(url):
+        return await get_client().get(url, params=params)
+
+
+async def close_clients():
+    """
+    Closes the running loop's client, e.g. from an ASGI lifespan shutdown handler.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.pop(loop, None)
+    _host_semaphores.pop(loop, None)
+    if entry is not None:
+        client, closer = entry
+        closer.cancel()
+        await client.aclose()
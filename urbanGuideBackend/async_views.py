@@ -0,0 +1,83 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from urbanGuideBackend.itinerary import assemble_itinerary, parse_places_request, places_failure, plan_venues, search_args, template_shape
+from urbanGuideBackend.itinerary_templates import afind_template
+from urbanGuideBackend.place_details import aget_place_details, set_validators
+from urbanGuideBackend.renderers import JsonResponse
+from urbanGuideBackend.search import afind_places
+from urbanGuideBackend.travel_times import aget_travel_times
+
+# Async variants of the Google-backed endpoints. Under ASGI they release the
+# worker while waiting on Google, so one process can serve many in-flight
+# itinerary builds through the pooled client in async_client.py.
+
+
+async def _authenticate(request):
+    # DRF views can't be async, so the JWT check is run explicitly here
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+@csrf_exempt
+async def get_places_async(request):
+    if request.method == "POST":
+        try:
+            # Parse JSON data from the POST request
+            options = parse_places_request(json.loads(request.body))
+
+            # Serve a precomputed itinerary for this area when there is one
+            shape = template_shape(options)
+            if shape is not None:
+                itinerary = await afind_template(*shape)
+                if itinerary is not None:
+                    return JsonResponse({'itinerary': itinerary}, safe=False)
+
+            status_code, payload = await afind_places(*search_args(options))
+            if status_code != 200:
+                return JsonResponse(places_failure(status_code, payload), status=status_code)
+
+            venues = plan_venues(payload, options)
+            travel_times = await aget_travel_times([venue["location"] for venue in venues], options["travel_mode"])
+            itinerary = assemble_itinerary(venues, travel_times, options["travel_mode"])
+
+            return JsonResponse({'itinerary': itinerary}, safe=False)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        return JsonResponse({'error': 'Invalid HTTP method'}, status=405)
+
+
+async def get_place_details_async(request, place_id):
+    if request.method != "GET":
+        return JsonResponse({'error': 'Invalid HTTP method'}, status=405)
+
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+
+    try:
+        status_code, details = await aget_place_details(place_id)
+
+        if details is None:
+            return JsonResponse({
+                'error': 'Failed to fetch place details',
+                'status_code': status_code
+            }, status=status_code)
+
+        not_modified = get_conditional_response(
+            request,
+            etag=details['etag'],
+            last_modified=details['last_modified'],
+        )
+        return set_validators(not_modified or JsonResponse(details['formatted'], status=200), details)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
@@ -0,0 +1,100 @@
+import hashlib
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.cache import ResponseCache, make_key
+
+# JWT authentication for the polled endpoints without a signature check and
+# a User query on every request: the verified token and its user are cached
+# until the token expires (at most JWT_AUTH_CACHE TTL). Saving or deleting
+# the user, or blacklisting one of their tokens, gives the user a new auth
+# version, which drops every cached entry of theirs.
+
+auth_cache = ResponseCache('jwt_auth', settings.JWT_AUTH_CACHE)
+
+
+def _version_key(user_id):
+    return make_key('version', str(user_id))
+
+
+def _user_version(user_id):
+    version = auth_cache.backend.get(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        auth_cache.backend.set(_version_key(user_id), version, auth_cache.ttl)
+    return version
+
+
+def invalidate_user(user_id):
+    # After commit, so a request racing the write can't cache the old user under the new version
+    transaction.on_commit(
+        lambda: auth_cache.backend.set(_version_key(user_id), uuid.uuid4().hex, auth_cache.ttl)
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication caching, per raw token, the validated token class and
+    the user's fields. Tokens are still fully validated (including the
+    blacklist check of token classes that have one) on a cache miss.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        key = hashlib.sha256(raw_token).hexdigest()
+        entry = auth_cache.get(key)
+        if entry is not None and entry['exp'] > time.time() and entry['version'] == _user_version(entry['user_id']):
+            token_class = api_settings.AUTH_TOKEN_CLASSES[entry['token_class']]
+            # Decoded without verification: the signature was checked when the entry was cached
+            return self._build_user(entry['user']), token_class(raw_token, verify=False)
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        # Read before caching so an invalidation racing this request isn't lost
+        version = _user_version(user.pk)
+        ttl = min(int(validated_token['exp'] - time.time()), auth_cache.ttl)
+        if ttl > 0:
+            auth_cache.set(key, {
+                'user_id': user.pk,
+                'version': version,
+                'exp': validated_token['exp'],
+                'token_class': list(api_settings.AUTH_TOKEN_CLASSES).index(type(validated_token)),
+                'user': {field.attname: getattr(user, field.attname) for field in user._meta.concrete_fields},
+            }, ttl)
+        return user, validated_token
+
+    def _build_user(self, fields):
+        # A fresh instance per request, so views can't change the cached one
+        return self.user_model.from_db('default', list(fields), list(fields.values()))
+
+
+def _user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+def _token_blacklisted(sender, instance, **kwargs):
+    if instance.token.user_id is not None:
+        invalidate_user(instance.token.user_id)
+
+
+def connect_signals():
+    # Called from AppConfig.ready, so every process invalidates, not only those serving the API.
+    # Password changes, deactivation and deletion take effect on the next request
+    post_save.connect(_user_changed, sender=get_user_model(), dispatch_uid='jwt_auth_user_saved')
+    post_delete.connect(_user_changed, sender=get_user_model(), dispatch_uid='jwt_auth_user_deleted')
+    post_save.connect(_token_blacklisted, sender=BlacklistedToken, dispatch_uid='jwt_auth_token_blacklisted')
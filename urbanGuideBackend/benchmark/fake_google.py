@@ -0,0 +1,164 @@
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from urbanGuideBackend.geo import haversine
+
+# Local stand-in for the Places Nearby Search, Place Details and Distance
+# Matrix APIs, so the benchmark never spends real quota. Responses are
+# deterministic for a given request; latency and failures are configurable.
+
+# Seconds per km for the fake travel times
+SECONDS_PER_KM = {'walking': 720, 'walk': 720, 'bicycling': 240, 'transit': 180, 'driving': 120}
+
+
+def _rng(*parts):
+    seed = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def fake_place(place_id, lat, lng, place_type, rng):
+    return {
+        "place_id": place_id,
+        "name": f"{place_type.replace('_', ' ').title()} {place_id[-4:]}",
+        "geometry": {"location": {"lat": lat, "lng": lng}},
+        "types": [place_type, "point_of_interest", "establishment"],
+        "vicinity": f"{rng.randint(1, 200)} Benchmark Street",
+        "rating": round(rng.uniform(3.0, 5.0), 1),
+        "user_ratings_total": rng.randint(5, 5000),
+    }
+
+
+def nearby_search(params):
+    lat, lng = map(float, params['location'].split(','))
+    radius_km = float(params.get('radius', 5000)) / 1000
+    keyword = params.get('keyword') or 'tourist_attraction'
+    rng = _rng(round(lat, 4), round(lng, 4), keyword)
+    results = []
+    for n in range(20):
+        # Spread within the radius; one degree of latitude is ~111 km
+        offset = radius_km / 111 * rng.random()
+        angle = rng.uniform(0, 2 * math.pi)
+        place_id = hashlib.sha1(f"{lat:.4f},{lng:.4f},{keyword},{n}".encode('utf-8')).hexdigest()[:20]
+        results.append(fake_place(place_id, lat + offset * math.sin(angle), lng + offset * math.cos(angle), keyword, rng))
+    return {"status": "OK", "results": results}
+
+
+def place_details(params):
+    place_id = params['place_id']
+    rng = _rng(place_id)
+    return {
+        "status": "OK",
+        "result": {
+            "name": f"Place {place_id[-4:]}",
+            "formatted_address": f"{rng.randint(1, 200)} Benchmark Street",
+            "formatted_phone_number": "+40 700 000 000",
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "photos": [{"photo_reference": f"{place_id}-{n}"} for n in range(rng.randint(0, 6))],
+            "editorial_summary": {"overview": "A place to benchmark."},
+            "url": f"https://maps.example.com/?cid={place_id}",
+            "website": "https://example.com",
+            "opening_hours": {"weekday_text": [f"Day {day}: 09:00 - 18:00" for day in range(7)]},
+            "price_level": rng.randint(0, 4),
+            "reviews": [
+                {"author_name": f"Reviewer {n}", "rating": rng.randint(1, 5), "text": "Fine.", "relative_time_description": "a week ago"}
+                for n in range(rng.randint(0, 5))
+            ],
+        },
+    }
+
+
+def distance_matrix(params):
+    origins = [tuple(map(float, origin.split(','))) for origin in params['origins'].split('|')]
+    destinations = [tuple(map(float, destination.split(','))) for destination in params['destinations'].split('|')]
+    seconds_per_km = SECONDS_PER_KM.get(params.get('mode', 'walking'), 720)
+    rows = []
+    for origin in origins:
+        elements = []
+        for destination in destinations:
+            seconds = int(float(haversine(origin[0], origin[1], destination[0], destination[1])) * seconds_per_km)
+            elements.append({
+                "status": "OK",
+                "duration": {"text": f"{max(1, seconds // 60)} mins", "value": seconds},
+            })
+        rows.append({"elements": elements})
+    return {"status": "OK", "rows": rows}
+
+
+ROUTES = {
+    '/place/nearbysearch/json': nearby_search,
+    '/place/details/json': place_details,
+    '/distancematrix/json': distance_matrix,
+}
+
+
+class FakeGoogleServer:
+    """
+    Threaded HTTP server answering like the Google Maps APIs under base_url.
+    Every response is delayed by latency_ms (with +-jitter) and fails with
+    HTTP 500 at error_rate.
+    """
+
+    def __init__(self, latency_ms=50, jitter=0.2, error_rate=0.0, host='127.0.0.1', port=0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status_code, payload = server.respond(url.path, params)
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def respond(self, path, params):
+        with self._lock:
+            self.requests += 1
+        delay = self.latency_ms / 1000 * random.uniform(1 - self.jitter, 1 + self.jitter)
+        time.sleep(max(delay, 0))
+        if random.random() < self.error_rate:
+            return 500, {"status": "UNKNOWN_ERROR"}
+        route = ROUTES.get(path)
+        if route is None:
+            return 404, {"status": "NOT_FOUND"}
+        try:
+            return 200, route(params)
+        except (KeyError, ValueError):
+            return 200, {"status": "INVALID_REQUEST", "error_message": "Missing or malformed parameters"}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-google', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
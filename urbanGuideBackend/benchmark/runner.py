@@ -0,0 +1,313 @@
+import io
+import json
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from urbanGuideBackend import pictures, schedules, settings
+from urbanGuideBackend.keywords import KEYWORD_MAPPING
+from urbanGuideBackend.models import UserProfile
+
+# Drives every API route in-process through Django's test client, against a
+# seeded database and the fake Google server, and reports latency
+# percentiles, throughput and DB query counts per endpoint.
+
+PASSWORD = 'benchmark-password'
+
+# Request locations spread over a city centre so searches hit several cache cells
+CITY_CENTRE = (44.4268, 26.1025)
+KEYWORDS = sorted(KEYWORD_MAPPING)
+
+
+class Context:
+    """
+    Seeded users, their tokens and the ids the scenarios refer to.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.users = []
+        self.admin = None
+        self.renditions = []
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def user(self, index):
+        return self.users[index % len(self.users)]
+
+
+class SeededUser:
+    def __init__(self, user):
+        self.user = user
+        refresh = RefreshToken.for_user(user)
+        self.refresh = str(refresh)
+        self.access = str(refresh.access_token)
+
+
+def location(index):
+    lat, lng = CITY_CENTRE
+    return f"{lat + (index % 7 - 3) * 0.01:.6f},{lng + (index % 5 - 2) * 0.01:.6f}"
+
+
+def fake_itinerary(index, venues=8):
+    itinerary = []
+    for n in range(venues):
+        if n:
+            itinerary.append({"type": "travel", "from": f"Venue {n - 1}", "to": f"Venue {n}", "travel_mode": "walk", "travel_time": "12 mins"})
+        itinerary.append({
+            "type": "venue",
+            "place_id": f"bench-place-{index}-{n}",
+            "name": f"Venue {n}",
+            "location": {"lat": CITY_CENTRE[0] + n * 0.002, "lng": CITY_CENTRE[1] + n * 0.002},
+            "start_time": None,
+            "end_time": None,
+            "visit_start_time": None,
+            "visit_end_time": None,
+        })
+    return itinerary
+
+
+def fake_picture(index):
+    output = io.BytesIO()
+    Image.new('RGB', (1600, 1200), (index * 37 % 256, 120, 200)).save(output, format='JPEG')
+    return output.getvalue()
+
+
+def seed(users, schedules_per_user, run_id):
+    """
+    Creates the benchmark users (one of them staff), each with a profile and
+    schedules_per_user schedules, and returns the Context.
+    """
+    context = Context(run_id)
+    # Hashed once: the benchmark measures requests, not seeding
+    password = make_password(PASSWORD)
+    created = User.objects.bulk_create([
+        User(username=f"bench-{run_id}-{n}", email=f"bench{n}@example.com", password=password)
+        for n in range(users)
+    ])
+    created = list(User.objects.filter(username__in=[user.username for user in created]).order_by('pk'))
+    profiles = UserProfile.objects.bulk_create([UserProfile(user=user, name=user.username) for user in created])
+    # A picture per profile, with its renditions built up front
+    for n, profile in enumerate(profiles):
+        profile.userPicture.save(f"bench-{run_id}-{n}.jpg", ContentFile(fake_picture(n)))
+        context.renditions.extend(pictures.build_renditions(profile.pk, profile.userPicture.name).values())
+    for n, user in enumerate(created):
+        for s in range(schedules_per_user):
+            schedules.create_schedule(user, f"Trip {s}", fake_itinerary(n))
+    context.users = [SeededUser(user) for user in created]
+
+    admin = User.objects.create(username=f"bench-{run_id}-admin", password=password, is_staff=True)
+    context.admin = SeededUser(admin)
+    return context
+
+
+class Scenario:
+    """
+    One endpoint to drive. auth is 'user', 'admin', 'metrics' (the
+    INSTRUMENTATION METRICS_TOKEN) or None. path and body may be callables taking
+    (context, index); prepare(context, index) runs untimed before the request
+    and may return the SeededUser to authenticate as.
+    """
+
+    def __init__(self, name, method, path, body=None, auth='user', prepare=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.auth = auth
+        self.prepare = prepare
+
+    def resolve(self, value, context, index):
+        return value(context, index) if callable(value) else value
+
+
+def _fresh_user(context, index):
+    user = User.objects.create(username=f"bench-{context.run_id}-fresh-{context.next_id()}", password='!')
+    return SeededUser(user)
+
+
+def _venue_name(context, index):
+    return f"Venue {index % 8}"
+
+
+def _place_id(context, index):
+    # A small set of ids, so repeated lookups exercise the details cache
+    return f"bench-place-{index % 25}"
+
+
+SCENARIOS = [
+    Scenario('token_obtain', 'POST', '/api/token/', auth=None,
+             body=lambda context, index: {"username": context.user(index).user.username, "password": PASSWORD}),
+    Scenario('token_refresh', 'POST', '/api/token/refresh/', auth=None,
+             body=lambda context, index: {"refresh": context.user(index).refresh}),
+    Scenario('protected', 'GET', '/api/protected/'),
+    Scenario('register', 'POST', '/api/register/', auth=None,
+             body=lambda context, index: {"username": f"bench-{context.run_id}-new-{context.next_id()}", "password": PASSWORD}),
+    Scenario('profile_create', 'POST', '/api/profile/create/', prepare=_fresh_user,
+             body={"name": "Benchmark"}),
+    Scenario('profile_update', 'PATCH', '/api/profile/update/', body={"name": "Benchmark updated"}),
+    Scenario('profile_get', 'GET', '/api/profile/get/'),
+    Scenario('places', 'POST', '/api/places/', auth=None,
+             body=lambda context, index: {"location": location(index), "keywords": [KEYWORDS[index % len(KEYWORDS)]]}),
+    Scenario('async_places', 'POST', '/api/async/places/', auth=None,
+             body=lambda context, index: {"location": location(index), "keywords": [KEYWORDS[(index + 3) % len(KEYWORDS)]]}),
+    Scenario('place_details', 'GET', lambda context, index: f"/api/places/details/{_place_id(context, index)}/"),
+    Scenario('async_place_details', 'GET', lambda context, index: f"/api/async/places/details/{_place_id(context, index)}/"),
+    Scenario('schedule_create', 'POST', '/api/schedule/create/',
+             body=lambda context, index: {"title": "Benchmark trip", "schedule": fake_itinerary(index)}),
+    Scenario('active_schedule', 'GET', '/api/schedule/get_active_schedule/'),
+    Scenario('next_venue', 'GET', '/api/schedule/get_next_venue/'),
+    Scenario('check_in', 'POST', '/api/schedule/check_in/',
+             body=lambda context, index: {"venue_name": _venue_name(context, index)}),
+    Scenario('check_out', 'POST', '/api/schedule/check_out/',
+             body=lambda context, index: {"venue_name": _venue_name(context, index)}),
+    Scenario('visits_sync', 'POST', '/api/schedule/visits/sync/',
+             body=lambda context, index: {"events": [
+                 {"type": "check_in", "venue_name": f"Venue {n}"} for n in range(4)
+             ] + [
+                 {"type": "check_out", "venue_name": f"Venue {n}"} for n in range(4)
+             ]}),
+    Scenario('history', 'GET', '/api/schedule/history/?limit=20'),
+    Scenario('history_stream', 'GET', '/api/schedule/history/?stream=true'),
+    Scenario('profile_picture', 'GET', '/api/profile/picture/?size=small'),
+    Scenario('serve_rendition', 'GET', auth=None,
+             path=lambda context, index: default_storage.url(context.renditions[index % len(context.renditions)])),
+    Scenario('cache_stats', 'GET', '/api/cache/stats/', auth='admin'),
+    Scenario('google_metrics', 'GET', '/api/google/metrics/', auth='admin'),
+    Scenario('metrics', 'GET', '/api/metrics/', auth='metrics'),
+]
+
+
+def _send(scenario, context, index):
+    """
+    Sends one request and returns (seconds, status_code, db_queries, error),
+    error being the start of the body of a failed response.
+    """
+    user = scenario.prepare(context, index) if scenario.prepare else None
+    if user is None and scenario.auth == 'user':
+        user = context.user(index)
+    elif scenario.auth == 'admin':
+        user = context.admin
+
+    if scenario.auth == 'metrics':
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {settings.INSTRUMENTATION['METRICS_TOKEN']}"}
+    else:
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {user.access}"} if user is not None else {}
+    body = scenario.resolve(scenario.body, context, index)
+    path = scenario.resolve(scenario.path, context, index)
+    client = Client()
+
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.generic(
+                scenario.method, path,
+                data=json.dumps(body) if body is not None else '',
+                content_type='application/json',
+                **headers,
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+    finally:
+        # Worker threads open their own connections; don't leak them between scenarios
+        connections.close_all()
+    error = None
+    if response.status_code >= 400 and not response.streaming:
+        error = response.content[:200].decode('utf-8', 'replace')
+    return elapsed, response.status_code, len(queries), error
+
+
+def run_scenario(scenario, context, requests, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(lambda index: _send(scenario, context, index), range(requests)))
+    wall = time.perf_counter() - started
+    return summarise(samples, wall)
+
+
+def summarise(samples, wall):
+    latencies = np.array([elapsed for elapsed, _, _, _ in samples]) * 1000
+    queries = np.array([count for _, _, count, _ in samples])
+    statuses = {}
+    errors = {}
+    for _, status_code, _, error in samples:
+        statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status_code, _, _ in samples if status_code >= 400),
+        "statuses": statuses,
+        # Distinct error bodies and how often each came back
+        "error_samples": errors,
+        "throughput_rps": round(len(samples) / wall, 2) if wall else None,
+        "mean_ms": round(float(latencies.mean()), 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "max_ms": round(float(latencies.max()), 2),
+        "db_queries_mean": round(float(queries.mean()), 2),
+        "db_queries_max": int(queries.max()),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(context, scenarios, requests, concurrency, meta):
+    """
+    Runs each scenario in turn and returns the report as a JSON-serialisable dict.
+    """
+    report = {
+        "meta": {
+            **meta,
+            "revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "requests_per_endpoint": requests,
+            "concurrency": concurrency,
+        },
+        "endpoints": {},
+    }
+    for scenario in scenarios:
+        report["endpoints"][scenario.name] = run_scenario(scenario, context, requests, concurrency)
+    return report
+
+
+def compare(baseline, current, threshold):
+    """
+    Returns (endpoint, metric, baseline, current, change) rows for the
+    latency metrics that got worse than threshold (a fraction) since baseline.
+    """
+    regressions = []
+    for name, metrics in current["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "db_queries_mean"):
+            before, after = previous.get(metric), metrics.get(metric)
+            if before and after is not None and (after - before) / before > threshold:
+                regressions.append((name, metric, before, after, (after - before) / before))
+    return regressions
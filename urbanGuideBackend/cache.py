@@ -0,0 +1,379 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Every ResponseCache registers itself here so its counters can be reported
+_registry = {}
+
+
+def make_key(*parts):
+    """
+    Builds a fixed-length cache key from any JSON-serialisable parts.
+    """
+    raw = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def record_stale(self):
+        # A stale entry served while it is refreshed still counts as a hit
+        with self._lock:
+            self.hits += 1
+            self.stale += 1
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
+
+
+class MemoryBackend:
+    """
+    In-process cache with per-entry TTL and LRU eviction.
+    """
+
+    def __init__(self, namespace, max_entries):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, mapping, ttl):
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DatabaseBackend:
+    """
+    Cache persisted in the CachedEntry table, shared by every worker process.
+    LRU eviction uses the accessed_at column. The entries are counted every
+    1% of max_entries writes rather than on each one, so the table can run
+    over max_entries by that much per process.
+    """
+
+    def __init__(self, namespace, max_entries):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.evict_interval = max(1, max_entries // 100)
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    @property
+    def _model(self):
+        # Imported lazily so this module can be loaded before the app registry
+        from urbanGuideBackend.models import CachedEntry
+        return CachedEntry
+
+    def get(self, key):
+        now = timezone.now()
+        entry = self._model.objects.filter(namespace=self.namespace, key=key).values('id', 'value', 'expires_at').first()
+        if entry is None:
+            return None
+        if entry['expires_at'] <= now:
+            self._model.objects.filter(id=entry['id']).delete()
+            return None
+        self._model.objects.filter(id=entry['id']).update(accessed_at=now)
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        now = timezone.now()
+        self._model.objects.update_or_create(
+            namespace=self.namespace,
+            key=key,
+            defaults={
+                'value': value,
+                'expires_at': now + timedelta(seconds=ttl),
+                'accessed_at': now,
+            },
+        )
+        self._evict(1)
+
+    def get_many(self, keys):
+        now = timezone.now()
+        entries = self._model.objects.filter(namespace=self.namespace, key__in=keys, expires_at__gt=now)
+        values = {entry['key']: entry['value'] for entry in entries.values('key', 'value')}
+        if values:
+            self._model.objects.filter(namespace=self.namespace, key__in=values.keys()).update(accessed_at=now)
+        return values
+
+    def set_many(self, mapping, ttl):
+        if not mapping:
+            return
+        now = timezone.now()
+        self._model.objects.bulk_create(
+            [
+                self._model(
+                    namespace=self.namespace,
+                    key=key,
+                    value=value,
+                    expires_at=now + timedelta(seconds=ttl),
+                    accessed_at=now,
+                )
+                for key, value in mapping.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['namespace', 'key'],
+            update_fields=['value', 'expires_at', 'accessed_at'],
+        )
+        self._evict(len(mapping))
+
+    def delete(self, key):
+        self._model.objects.filter(namespace=self.namespace, key=key).delete()
+
+    def clear(self):
+        self._model.objects.filter(namespace=self.namespace).delete()
+
+    def _evict(self, writes):
+        with self._writes_lock:
+            self._writes += writes
+            if self._writes < self.evict_interval:
+                return
+            self._writes = 0
+        entries = self._model.objects.filter(namespace=self.namespace)
+        excess = entries.count() - self.max_entries
+        if excess > 0:
+            stale_ids = list(entries.order_by('accessed_at').values_list('id', flat=True)[:excess])
+            self._model.objects.filter(id__in=stale_ids).delete()
+
+
+class DjangoCacheBackend:
+    """
+    Delegates to one of Django's configured CACHES. Eviction is left to the
+    cache backend itself.
+    """
+
+    def __init__(self, namespace, alias='default'):
+        self.namespace = namespace
+        self.alias = alias
+
+    @property
+    def _cache(self):
+        # Looked up on use: Django keeps a cache per thread, and settings overrides replace them
+        return caches[self.alias]
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        return self._cache.get(self._key(key))
+
+    def set(self, key, value, ttl):
+        self._cache.set(self._key(key), value, ttl)
+
+    def get_many(self, keys):
+        values = self._cache.get_many([self._key(key) for key in keys])
+        prefix_length = len(self.namespace) + 1
+        return {key[prefix_length:]: value for key, value in values.items()}
+
+    def set_many(self, mapping, ttl):
+        self._cache.set_many({self._key(key): value for key, value in mapping.items()}, ttl)
+
+    def delete(self, key):
+        self._cache.delete(self._key(key))
+
+    def clear(self):
+        # Django caches can't be cleared per prefix, so only the whole cache can go
+        self._cache.clear()
+
+
+class AmortizedFileBasedCache(FileBasedCache):
+    """
+    Django's file cache, checking its size every CULL_INTERVAL writes
+    instead of on each one.
+
+    FileBasedCache lists the whole cache directory before every write to
+    decide whether to cull, which costs O(entries) in the request path. Between
+    checks the directory can grow past MAX_ENTRIES by up to CULL_INTERVAL
+    entries per worker process.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_interval = max(1, int(params.get('OPTIONS', {}).get('CULL_INTERVAL', 100)))
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def _cull(self):
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes < self._cull_interval:
+                return
+            self._writes = 0
+        super()._cull()
+
+
+def is_process_local_alias(alias):
+    """
+    Returns whether Django's cache alias is only seen by the process using it.
+    """
+    # Read from the configuration: creating the cache could already touch its storage
+    return issubclass(import_string(caches.settings[alias]['BACKEND']), LocMemCache)
+
+
+def is_process_local(backend):
+    """
+    Returns whether entries stored in backend are only seen by the process storing them.
+    """
+    if isinstance(backend, MemoryBackend):
+        return True
+    return isinstance(backend, DjangoCacheBackend) and is_process_local_alias(backend.alias)
+
+
+def build_backend(namespace, options):
+    backend = options.get('BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryBackend(namespace, options.get('MAX_ENTRIES', 1000))
+    if backend == 'database':
+        return DatabaseBackend(namespace, options.get('MAX_ENTRIES', 1000))
+    if backend == 'django':
+        return DjangoCacheBackend(namespace, options.get('ALIAS', 'default'))
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+class ResponseCache:
+    """
+    A namespaced cache of JSON-serialisable upstream responses with hit/miss counters.
+
+    With a STALE_TTL option, entries are kept that much longer than their TTL
+    so get_stale/get_many_stale can serve them while a refresh runs; plain
+    get/get_many only return fresh entries.
+    """
+
+    def __init__(self, namespace, options):
+        self.namespace = namespace
+        self.ttl = options.get('TTL', 60 * 60)
+        self.stale_ttl = options.get('STALE_TTL', 0)
+        self.backend = build_backend(namespace, options)
+        self.stats = CacheStats()
+        _registry[namespace] = self
+
+    def _wrap(self, value, ttl):
+        if not self.stale_ttl:
+            return value
+        return {'value': value, 'fresh_until': time.time() + ttl}
+
+    def _unwrap(self, stored):
+        # Returns (value, is_stale); entries written without STALE_TTL count as fresh
+        if self.stale_ttl and isinstance(stored, dict) and stored.keys() == {'value', 'fresh_until'}:
+            return stored['value'], stored['fresh_until'] <= time.time()
+        return stored, False
+
+    def _record(self, value, stale):
+        if value is None:
+            self.stats.record_miss()
+        elif stale:
+            self.stats.record_stale()
+        else:
+            self.stats.record_hit()
+
+    def get(self, key):
+        value, stale = self._unwrap(self.backend.get(key))
+        if stale:
+            value = None
+        self._record(value, False)
+        return value
+
+    def get_stale(self, key):
+        """
+        Returns (value, is_stale); value is None on a miss.
+        """
+        value, stale = self._unwrap(self.backend.get(key))
+        self._record(value, stale)
+        return value, stale
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.backend.set(key, self._wrap(value, ttl), ttl + self.stale_ttl)
+
+    def get_many(self, keys):
+        entries = self.get_many_stale(keys, record=False)
+        values = {key: value for key, (value, stale) in entries.items() if not stale}
+        for key in keys:
+            self._record(values.get(key), False)
+        return values
+
+    def get_many_stale(self, keys, record=True):
+        """
+        Returns {key: (value, is_stale)} for the keys found.
+        """
+        entries = {key: self._unwrap(stored) for key, stored in self.backend.get_many(keys).items()}
+        if record:
+            for key in keys:
+                self._record(*entries.get(key, (None, False)))
+        return entries
+
+    def set_many(self, mapping, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.backend.set_many({key: self._wrap(value, ttl) for key, value in mapping.items()}, ttl + self.stale_ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def get_cache_stats():
+    return {namespace: cache.stats.as_dict() for namespace, cache in _registry.items()}
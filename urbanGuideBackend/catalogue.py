@@ -0,0 +1,213 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.geo import distances_from
+
+# Degrees of latitude per km (and of longitude at the equator)
+KM_PER_DEGREE = 111.32
+
+
+class PlaceIndex:
+    """
+    In-memory grid index over the KnownPlace catalogue. Places are bucketed by
+    (lat, lng) grid cell so a radius query only scans the few cells overlapping
+    its bounding box.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells = defaultdict(dict)
+        self._cell_of = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def add(self, place):
+        cell = self._cell(place["lat"], place["lng"])
+        with self._lock:
+            previous = self._cell_of.get(place["place_id"])
+            if previous is not None and previous != cell:
+                self._cells[previous].pop(place["place_id"], None)
+            self._cells[cell][place["place_id"]] = place
+            self._cell_of[place["place_id"]] = cell
+
+    def update(self, place_id, fields):
+        # The entry is replaced rather than changed, as queries may still hold the old one
+        with self._lock:
+            cell = self._cell_of.get(place_id)
+            if cell is not None:
+                self._cells[cell][place_id] = {**self._cells[cell][place_id], **fields}
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def query(self, lat, lng, radius_km, tags=None, updated_after=None):
+        """
+        Returns (distance_km, place) pairs within radius_km, nearest first,
+        optionally restricted to places carrying any of tags.
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        min_cell = self._cell(lat - dlat, lng - dlng)
+        max_cell = self._cell(lat + dlat, lng + dlng)
+        tags = set(tags) if tags else None
+
+        candidates = []
+        with self._lock:
+            for cell_lat in range(min_cell[0], max_cell[0] + 1):
+                for cell_lng in range(min_cell[1], max_cell[1] + 1):
+                    for place in self._cells.get((cell_lat, cell_lng), {}).values():
+                        if tags is not None and not tags.intersection(place["tags"]):
+                            continue
+                        if updated_after is not None and place["updated_at"] < updated_after:
+                            continue
+                        candidates.append(place)
+
+        if not candidates:
+            return []
+        distances = distances_from(lat, lng, [place["lat"] for place in candidates], [place["lng"] for place in candidates])
+        matches = [(distance, place) for distance, place in zip(distances.tolist(), candidates) if distance <= radius_km]
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+place_index = PlaceIndex(settings.PLACE_CATALOGUE['CELL_SIZE'])
+_loaded_at = None  # time.monotonic() of the last load
+_loaded_since = None  # timezone.now() when the last load started
+_load_lock = threading.Lock()
+# Writers stamp updated_at before they commit, so each reload also reads back this many seconds
+RELOAD_OVERLAP = 60
+
+
+def _as_index_entry(place):
+    return {
+        "place_id": place.place_id,
+        "name": place.name,
+        "lat": place.lat,
+        "lng": place.lng,
+        "types": place.types,
+        "tags": place.tags,
+        "vicinity": place.vicinity,
+        "rating": place.rating,
+        "user_ratings_total": place.user_ratings_total,
+        "updated_at": place.updated_at.timestamp(),
+    }
+
+
+def _ensure_loaded():
+    # The first call loads the whole catalogue. Later ones, every RELOAD_INTERVAL, only add the
+    # places other worker processes recorded or updated since the previous load
+    global _loaded_at, _loaded_since
+    reload_interval = settings.PLACE_CATALOGUE['RELOAD_INTERVAL']
+    if _loaded_at is not None and time.monotonic() - _loaded_at < reload_interval:
+        return
+    # Only the first load is waited for; meanwhile other requests keep querying the current index
+    if not _load_lock.acquire(blocking=_loaded_at is None):
+        return
+    try:
+        if _loaded_at is not None and time.monotonic() - _loaded_at < reload_interval:
+            return
+        from urbanGuideBackend.models import KnownPlace
+
+        started = timezone.now()
+        places = KnownPlace.objects.all()
+        if _loaded_since is not None:
+            places = places.filter(updated_at__gte=_loaded_since - timedelta(seconds=RELOAD_OVERLAP))
+        for place in places.iterator():
+            place_index.add(_as_index_entry(place))
+        _loaded_since = started
+        _loaded_at = time.monotonic()
+    finally:
+        _load_lock.release()
+
+
+def record_search_results(results, place_types):
+    """
+    Upserts Nearby Search results into the catalogue, tagging them with the
+    mapped types they were found for.
+    """
+    from urbanGuideBackend.models import KnownPlace
+
+    located = [
+        place for place in results
+        if place.get("place_id") and place.get("geometry", {}).get("location", {}).get("lat") is not None
+    ]
+    if not located:
+        return
+
+    existing_tags = dict(
+        KnownPlace.objects.filter(place_id__in=[place["place_id"] for place in located]).values_list('place_id', 'tags')
+    )
+    now = timezone.now()
+    places = []
+    for place in located:
+        location = place["geometry"]["location"]
+        places.append(KnownPlace(
+            place_id=place["place_id"],
+            name=place.get("name") or "",
+            lat=location["lat"],
+            lng=location["lng"],
+            types=place.get("types", []),
+            tags=sorted(set(existing_tags.get(place["place_id"], [])) | set(place_types)),
+            vicinity=place.get("vicinity"),
+            rating=place.get("rating"),
+            user_ratings_total=place.get("user_ratings_total"),
+            updated_at=now,
+        ))
+
+    KnownPlace.objects.bulk_create(
+        places,
+        update_conflicts=True,
+        unique_fields=['place_id'],
+        update_fields=['name', 'lat', 'lng', 'types', 'tags', 'vicinity', 'rating', 'user_ratings_total', 'updated_at'],
+    )
+    for place in places:
+        place_index.add(_as_index_entry(place))
+
+
+def record_place_details(place_id, result):
+    """
+    Refreshes the catalogue entry of a place from a Details response.
+    """
+    from urbanGuideBackend.models import KnownPlace
+
+    updates = {field: result[field] for field in ('name', 'rating') if result.get(field) is not None}
+    if not updates:
+        return
+    now = timezone.now()
+    KnownPlace.objects.filter(place_id=place_id).update(updated_at=now, **updates)
+    place_index.update(place_id, {**updates, "updated_at": now.timestamp()})
+
+
+def find_candidates(lat, lng, radius, place_types, limit):
+    """
+    Returns up to limit catalogue places within radius (in meters) matching
+    place_types, in the Nearby Search result shape, most reviewed first.
+    """
+    if not place_types:
+        return []
+    _ensure_loaded()
+    updated_after = time.time() - settings.PLACE_CATALOGUE['MAX_AGE']
+    matches = place_index.query(lat, lng, float(radius) / 1000, tags=place_types, updated_after=updated_after)
+
+    # Nearby Search ranks by prominence; review count is the closest local proxy
+    places = sorted((place for _, place in matches), key=lambda place: place["user_ratings_total"] or 0, reverse=True)
+    return [
+        {
+            "place_id": place["place_id"],
+            "name": place["name"],
+            "geometry": {"location": {"lat": place["lat"], "lng": place["lng"]}},
+            "types": place["types"],
+            "vicinity": place["vicinity"],
+            "rating": place["rating"],
+            "user_ratings_total": place["user_ratings_total"],
+        }
+        for place in places[:limit]
+    ]
@@ -0,0 +1,100 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance in km. Every argument may be a scalar or an array;
+    arrays are broadcast against each other, so one call covers many points.
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distances_from(lat, lng, lats, lngs):
+    """
+    Distances in km from one point to every point of the lats/lngs arrays.
+    """
+    return haversine(lat, lng, lats, lngs)
+
+
+def distance_matrix(lats, lngs):
+    """
+    Full pairwise n x n distance matrix in km for the given coordinates.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    return haversine(lats[:, None], lngs[:, None], lats[None, :], lngs[None, :])
+
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_INDEX = {char: index for index, char in enumerate(_GEOHASH_ALPHABET)}
+
+
+def geohash_encode(lat, lng, precision=6):
+    """
+    Encodes a coordinate as a geohash string. Precision 6 cells are roughly
+    1.2km x 0.6km, precision 7 cells roughly 150m x 150m.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        coord_range, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (coord_range[0] + coord_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            coord_range[0] = mid
+        else:
+            coord_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def geohash_bounds(geohash):
+    """
+    Returns the (min_lat, min_lng, max_lat, max_lng) bounding box of a geohash cell.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        bits = _GEOHASH_INDEX[char]
+        for shift in range(4, -1, -1):
+            coord_range = lng_range if even else lat_range
+            mid = (coord_range[0] + coord_range[1]) / 2
+            if (bits >> shift) & 1:
+                coord_range[0] = mid
+            else:
+                coord_range[1] = mid
+            even = not even
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def geohash_center(geohash):
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def snap_coordinate(lat, lng, decimals=4):
+    """
+    Rounds a coordinate onto a fixed grid (4 decimals is about 11m) so nearby
+    points share cache keys.
+    """
+    return round(lat, decimals), round(lng, decimals)
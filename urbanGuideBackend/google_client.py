@@ -0,0 +1,268 @@
+import asyncio
+import random
+import threading
+import time
+from functools import partial
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from urbanGuideBackend import async_client, instrumentation, settings
+from urbanGuideBackend.cache import make_key
+from urbanGuideBackend.singleflight import AsyncSingleFlight, SingleFlight, shared_call
+
+# Single entry point for every Google Maps API call. It owns the pooled
+# session, timeouts, retries, the per-endpoint circuit breakers and metrics.
+
+ENDPOINTS = {
+    'nearby_search': 'place/nearbysearch/json',
+    'details': 'place/details/json',
+    'distance_matrix': 'distancematrix/json',
+}
+
+# Payload statuses worth retrying (Google answers quota errors with HTTP 200)
+RETRYABLE_STATUSES = ('OVER_QUERY_LIMIT', 'UNKNOWN_ERROR')
+
+
+class GoogleAPIUnavailable(Exception):
+    """
+    Raised when an endpoint's circuit is open or it could not be reached after retries.
+    """
+
+
+def endpoint_url(endpoint):
+    return f"{settings.GOOGLE_MAPS_API_BASE_URL}/{ENDPOINTS[endpoint]}"
+
+
+class CircuitBreaker:
+    """
+    Opens after FAILURE_THRESHOLD consecutive failures and fails fast until
+    RESET_TIMEOUT has passed, then lets a single trial request through.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency, error):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "avg_latency_ms": round(self.total_latency / self.requests * 1000, 2) if self.requests else None,
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+        }
+
+
+_breakers = {
+    endpoint: CircuitBreaker(
+        settings.GOOGLE_API_CLIENT['CIRCUIT_FAILURE_THRESHOLD'],
+        settings.GOOGLE_API_CLIENT['CIRCUIT_RESET_TIMEOUT'],
+    )
+    for endpoint in ENDPOINTS
+}
+_metrics = {endpoint: EndpointMetrics() for endpoint in ENDPOINTS}
+_flights = SingleFlight()
+_async_flights = AsyncSingleFlight()
+
+
+def _build_session():
+    options = settings.GOOGLE_API_CLIENT
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=options['POOL_CONNECTIONS'], pool_maxsize=options['POOL_MAXSIZE'])
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = _build_session()
+
+
+def _parse(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def _should_retry(status_code, payload):
+    return status_code >= 500 or payload.get('status') in RETRYABLE_STATUSES
+
+
+def _backoff(attempt):
+    base = settings.GOOGLE_API_CLIENT['BACKOFF_FACTOR']
+    return base * (2 ** attempt) + random.uniform(0, base)
+
+
+def _check_breaker(endpoint):
+    if not _breakers[endpoint].allow_request():
+        _metrics[endpoint].record_rejected()
+        raise GoogleAPIUnavailable(f"Google {endpoint} API circuit is open")
+
+
+def _finish(endpoint, failed):
+    if failed:
+        _breakers[endpoint].record_failure()
+    else:
+        _breakers[endpoint].record_success()
+
+
+def get(endpoint, params):
+    """
+    Calls a Google Maps endpoint and returns (status_code, payload).
+    Retries with exponential backoff on 5xx, timeouts and OVER_QUERY_LIMIT.
+    Raises GoogleAPIUnavailable when the circuit is open or the API can't be reached.
+    Identical calls made while one is in flight share its response.
+    """
+    key = make_key(endpoint, params)
+    fetch = partial(_get, endpoint, params)
+    if settings.SINGLE_FLIGHT['CROSS_PROCESS']:
+        fetch = partial(shared_call, key, fetch)
+    # Timed as the caller sees it: retries and waits on a shared call included
+    with instrumentation.timed(f"google.{endpoint}"):
+        return _flights.do(key, fetch, on_shared=_metrics[endpoint].record_coalesced)
+
+
+def _get(endpoint, params):
+    _check_breaker(endpoint)
+    options = settings.GOOGLE_API_CLIENT
+    url = endpoint_url(endpoint)
+
+    for attempt in range(options['MAX_RETRIES'] + 1):
+        if attempt:
+            _metrics[endpoint].record_retry()
+            time.sleep(_backoff(attempt - 1))
+
+        started = time.perf_counter()
+        try:
+            response = _session.get(url, params=params, timeout=(options['CONNECT_TIMEOUT'], options['READ_TIMEOUT']))
+        except requests.RequestException:
+            _metrics[endpoint].record(time.perf_counter() - started, error=True)
+            continue
+
+        status_code, payload = response.status_code, _parse(response)
+        retry = _should_retry(status_code, payload)
+        _metrics[endpoint].record(time.perf_counter() - started, error=retry or status_code != 200)
+        if not retry or attempt == options['MAX_RETRIES']:
+            _finish(endpoint, failed=retry)
+            return status_code, payload
+
+    _finish(endpoint, failed=True)
+    raise GoogleAPIUnavailable(f"Google {endpoint} API could not be reached")
+
+
+async def aget(endpoint, params):
+    """
+    Async variant of get using the pooled async HTTP client. Calls are
+    coalesced per event loop only.
+    """
+    with instrumentation.timed(f"google.{endpoint}"):
+        return await _async_flights.do(
+            make_key(endpoint, params),
+            partial(_aget, endpoint, params),
+            on_shared=_metrics[endpoint].record_coalesced,
+        )
+
+
+async def _aget(endpoint, params):
+    _check_breaker(endpoint)
+    options = settings.GOOGLE_API_CLIENT
+    url = endpoint_url(endpoint)
+
+    for attempt in range(options['MAX_RETRIES'] + 1):
+        if attempt:
+            _metrics[endpoint].record_retry()
+            await asyncio.sleep(_backoff(attempt - 1))
+
+        started = time.perf_counter()
+        try:
+            response = await async_client.get(url, params=params)
+        except httpx.HTTPError:
+            _metrics[endpoint].record(time.perf_counter() - started, error=True)
+            continue
+
+        status_code, payload = response.status_code, _parse(response)
+        retry = _should_retry(status_code, payload)
+        _metrics[endpoint].record(time.perf_counter() - started, error=retry or status_code != 200)
+        if not retry or attempt == options['MAX_RETRIES']:
+            _finish(endpoint, failed=retry)
+            return status_code, payload
+
+    _finish(endpoint, failed=True)
+    raise GoogleAPIUnavailable(f"Google {endpoint} API could not be reached")
+
+
+def get_metrics():
+    return {
+        endpoint: {**_metrics[endpoint].as_dict(), "circuit": _breakers[endpoint].state}
+        for endpoint in ENDPOINTS
+    }
@@ -0,0 +1,13 @@
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+from urbanGuideBackend import settings
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the iteration count taken from
+    PASSWORD_HASHING ITERATIONS. It keeps the pbkdf2_sha256 algorithm name,
+    so existing hashes still verify and are re-hashed at the configured
+    count on the user's next login.
+    """
+    iterations = settings.PASSWORD_HASHING['ITERATIONS'] or PBKDF2PasswordHasher.iterations
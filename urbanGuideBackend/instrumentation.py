@@ -0,0 +1,277 @@
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import import_string
+
+from urbanGuideBackend import settings
+
+# Per-request timings: wall time, DB queries and time, Google calls per
+# endpoint and JSON rendering. InstrumentationMiddleware starts a RequestTimings
+# for each request; the DB wrapper, google_client and renderers add spans to
+# it. At the end of the request the spans go out as a Server-Timing header and
+# to the configured exporters (INSTRUMENTATION['EXPORTERS']).
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Spans recorded during one request, as name -> [count, seconds]. Spans
+    may be added from worker threads (see bind), hence the lock.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            span = self.spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        entries = [
+            f'{name};dur={seconds * 1000:.1f};desc="{count}x"'
+            for name, (count, seconds) in sorted(self.spans.items())
+        ]
+        entries.append(f'total;dur={self.duration * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def record(name, seconds):
+    """
+    Adds a span to the current request's timings. A no-op outside a request.
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+class timed:
+    """
+    Context manager recording the time spent in its block as span name.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.started)
+
+
+def bind(func):
+    """
+    Wraps func so it records into the calling request's timings when run on
+    an executor thread (threads don't inherit context variables).
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # A copy per call: one context can't be entered by two threads at once
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def _record_query(execute, sql, params, many, context):
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record('db', time.perf_counter() - started)
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+# Every connection, in any thread, reports its queries to the request it runs for
+connection_created.connect(_install_query_wrapper)
+
+
+class Histogram:
+    """
+    Cumulative Prometheus-style histogram per label set.
+    """
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['count'] += 1
+            series['sum'] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: {**values, 'buckets': list(values['buckets'])} for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            for bound, count in zip(self.buckets, values['buckets']):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values["count"]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {values["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {values["count"]}')
+        return '\n'.join(lines)
+
+
+class PrometheusExporter:
+    """
+    Aggregates requests into histograms, served in the Prometheus text
+    format by the api/metrics/ endpoint.
+    """
+
+    def __init__(self):
+        buckets = settings.INSTRUMENTATION['BUCKETS']
+        self.request_seconds = Histogram(
+            'urbanguide_request_duration_seconds', "Request wall time.",
+            ('view', 'method', 'status'), buckets,
+        )
+        self.span_seconds = Histogram(
+            'urbanguide_request_span_seconds', "Time per request spent in each span (db, render, google.*).",
+            ('view', 'span'), buckets,
+        )
+        self.span_calls = Histogram(
+            'urbanguide_request_span_calls', "Calls per request of each span (DB queries, Google calls, renders).",
+            ('view', 'span'), (1, 2, 5, 10, 20, 50, 100, 200),
+        )
+
+    def export(self, view, method, status_code, timings):
+        self.request_seconds.observe((view, method, f"{status_code // 100}xx"), timings.duration)
+        for name, (count, seconds) in timings.spans.items():
+            self.span_seconds.observe((view, name), seconds)
+            self.span_calls.observe((view, name), count)
+
+    def render(self):
+        return '\n'.join(
+            histogram.render() for histogram in (self.request_seconds, self.span_seconds, self.span_calls)
+        ) + '\n'
+
+
+class LogExporter:
+    """
+    Writes one JSON line per request to this module's logger.
+    """
+
+    def export(self, view, method, status_code, timings):
+        logger.info(json.dumps({
+            "view": view,
+            "method": method,
+            "status": status_code,
+            "duration_ms": round(timings.duration * 1000, 2),
+            "spans": {
+                name: {"count": count, "ms": round(seconds * 1000, 2)}
+                for name, (count, seconds) in timings.spans.items()
+            },
+        }))
+
+
+_exporters = None
+_exporters_lock = threading.Lock()
+
+
+def get_exporters():
+    global _exporters
+    if _exporters is None:
+        with _exporters_lock:
+            if _exporters is None:
+                _exporters = [import_string(path)() for path in settings.INSTRUMENTATION['EXPORTERS']]
+    return _exporters
+
+
+def render_prometheus():
+    """
+    Returns the Prometheus text of every PrometheusExporter in use.
+    """
+    return ''.join(exporter.render() for exporter in get_exporters() if isinstance(exporter, PrometheusExporter))
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name or match.view_name) if match else 'unmatched'
+
+
+class InstrumentationMiddleware:
+    """
+    Times each request and reports it. Put it first in MIDDLEWARE so the
+    other middleware is counted too. Works under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections opened before this module was loaded missed the signal
+        for connection in connections.all(initialized_only=True):
+            _install_query_wrapper(None, connection)
+        token = _current.set(RequestTimings())
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = _current.get()
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        token = _current.set(RequestTimings())
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = _current.get()
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        timings.finish()
+        if settings.INSTRUMENTATION['SERVER_TIMING']:
+            # Streamed bodies are still to be generated; their time isn't in the header
+            response.headers['Server-Timing'] = timings.server_timing()
+        view = _view_name(request)
+        for exporter in get_exporters():
+            try:
+                exporter.export(view, request.method, response.status_code, timings)
+            except Exception:
+                logger.exception("Exporter %r failed", exporter)
+        return response
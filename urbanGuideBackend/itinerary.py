@@ -0,0 +1,230 @@
+from urbanGuideBackend import settings
+from urbanGuideBackend.geo import distance_matrix, distances_from
+from urbanGuideBackend.keywords import KEYWORD_MAPPING
+from urbanGuideBackend.routing import plan_route
+
+
+def parse_max_venues(value):
+    """
+    Returns the "max_venues" option as an int between 1 and MAX_ITINERARY_VENUES.
+    Raises ValueError if it isn't an integer.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("max_venues must be an integer")
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError("max_venues must be an integer") from None
+    return max(1, min(count, settings.MAX_ITINERARY_VENUES))
+
+
+def parse_places_request(data):
+    """
+    Returns the options of a get_places request body, with defaults filled in.
+    Raises ValueError if the location or max_venues is invalid.
+    """
+    location = data.get('location', '40.712776,-74.005974')  # Default to NYC
+    # Parse user's current location (latitude, longitude)
+    user_lat, user_lng = map(float, location.split(','))
+    return {
+        "user_lat": user_lat,
+        "user_lng": user_lng,
+        "radius": data.get('radius', 5000),  # Default radius 5km
+        # Map keywords to Google Places types
+        "place_types": [KEYWORD_MAPPING[keyword] for keyword in data.get('keywords', []) if keyword in KEYWORD_MAPPING],
+        "travel_mode": data.get('travel_mode', 'walk'),  # Default travel mode: walk
+        "max_venues": parse_max_venues(data.get('max_venues', 8)),  # Between 1 and MAX_ITINERARY_VENUES
+        "optimize_route": data.get('optimize_route', True),  # Order venues as a short route
+        "start_place_id": data.get('start_place_id'),
+        "end_place_id": data.get('end_place_id'),
+    }
+
+
+def template_shape(options):
+    """
+    Returns the find_template arguments for the request, or None if a
+    precomputed itinerary can't serve it: templates are optimised routes
+    without fixed start or end venues.
+    """
+    if not options["optimize_route"] or options["start_place_id"] or options["end_place_id"]:
+        return None
+    return (
+        options["user_lat"], options["user_lng"], options["radius"],
+        options["place_types"], options["travel_mode"], options["max_venues"],
+    )
+
+
+def search_args(options):
+    # The find_places arguments for the request
+    return options["user_lat"], options["user_lng"], options["radius"], options["place_types"], options["max_venues"]
+
+
+def plan_venues(payload, options):
+    """
+    Turns a successful find_places payload into the request's venues, in
+    visiting order.
+    """
+    results = payload.get('results', [])[:options["max_venues"]]
+    venues = enrich_places(results, options["user_lat"], options["user_lng"])
+    if options["optimize_route"]:
+        venues = order_venues(
+            venues, options["user_lat"], options["user_lng"],
+            start_place_id=options["start_place_id"],
+            end_place_id=options["end_place_id"],
+        )
+    return venues
+
+
+def places_failure(status_code, payload):
+    # Body of the error response to a failed find_places
+    return {
+        'error': 'Failed to fetch places',
+        'status_code': status_code,
+        'message': payload.get('error_message', 'Unknown error')
+    }
+
+
+def enrich_places(results, user_lat, user_lng):
+    """
+    Converts Nearby Search results into venue items sorted by distance from the user.
+    """
+    locations = [place.get("geometry", {}).get("location", {}) for place in results]
+    located = [i for i, location in enumerate(locations) if location.get("lat") is not None and location.get("lng") is not None]
+
+    # Distances for every candidate in one vectorised call; unlocated places sort last
+    distances = [float('inf')] * len(results)
+    if located:
+        located_distances = distances_from(
+            user_lat, user_lng,
+            [locations[i]["lat"] for i in located],
+            [locations[i]["lng"] for i in located],
+        )
+        for i, distance in zip(located, located_distances.tolist()):
+            distances[i] = distance
+
+    enriched_results = []
+    for place, place_location, distance in zip(results, locations, distances):
+        enriched_place = {
+            "type": "venue",
+            "place_id": place.get("place_id"),
+            "name": place.get("name"),
+            "location": place_location,
+            "types": place.get("types", []),
+            "vicinity": place.get("vicinity"),
+            "rating": place.get("rating"),
+            "user_ratings_total": place.get("user_ratings_total"),
+            "distance": distance,  # Add distance
+            "start_time": None,  # To be calculated
+            "end_time": None,  # To be calculated
+            "visit_start_time": None,
+            "visit_end_time" : None
+        }
+
+        enriched_results.append(enriched_place)
+
+    # Sort results by distance
+    enriched_results.sort(key=lambda x: x["distance"])
+    return enriched_results
+
+
+def order_venues(venues, user_lat, user_lng, start_place_id=None, end_place_id=None):
+    """
+    Reorders venues into a short walking route instead of plain distance order.
+    The route starts at the user's position (or at start_place_id) and, if
+    end_place_id is given, finishes there. Venues without a location go last.
+    """
+    routable = [venue for venue in venues if venue["distance"] != float('inf')]
+    unroutable = [venue for venue in venues if venue["distance"] == float('inf')]
+
+    place_ids = [venue["place_id"] for venue in routable]
+    start = place_ids.index(start_place_id) if start_place_id in place_ids else None
+    end = place_ids.index(end_place_id) if end_place_id in place_ids and end_place_id != start_place_id else None
+
+    lats = [venue["location"]["lat"] for venue in routable]
+    lngs = [venue["location"]["lng"] for venue in routable]
+    if start is None:
+        # Anchor the route on the user's position as an extra first node
+        lats = [user_lat] + lats
+        lngs = [user_lng] + lngs
+        offset = 1
+        start = 0
+        end = end + 1 if end is not None else None
+    else:
+        offset = 0
+
+    matrix = distance_matrix(lats, lngs).tolist()
+    order = plan_route(matrix, start=start, end=end, time_budget_ms=settings.ROUTE_OPTIMIZATION_TIME_BUDGET_MS)
+    return [routable[node - offset] for node in order if node >= offset] + unroutable
+
+
+def assemble_itinerary(venues, travel_times, travel_mode):
+    """
+    Interleaves venues with travel items and assigns the estimated visit times.
+    travel_times[i] is the travel time from venues[i] to venues[i + 1].
+    """
+    itinerary = []
+    for i in range(len(venues) - 1):
+        # Add venue
+        itinerary.append(venues[i])
+
+        # Add travel
+        itinerary.append({
+            "type": "travel",
+            "from": venues[i]["name"],
+            "to": venues[i + 1]["name"],
+            "travel_mode": travel_mode,
+            "travel_time": travel_times[i],
+        })
+
+    # Add the last venue
+    itinerary.append(venues[-1])
+
+    assign_times(itinerary)
+    return itinerary
+
+
+def assign_times(itinerary):
+    """
+    Sets the estimated start and end time of every venue in the itinerary.
+    """
+    # Assign start and end times (arbitrary estimates)
+    start_time = 9 * 60  # Start at 9:00 AM in minutes
+    for item in itinerary:
+        if item["type"] == "venue":
+            visit_duration = 60  # Assume 1 hour per place
+            item["start_time"] = f"{start_time // 60:02d}:{start_time % 60:02d} AM"
+            end_time = start_time + visit_duration
+            item["end_time"] = f"{end_time // 60:02d}:{end_time % 60:02d} AM"
+            start_time = end_time + 30  # Add 30 minutes for travel
+
+
+def template_venues(itinerary, user_lat, user_lng, radius):
+    """
+    Returns copies of the venues of a stored itinerary for a user at
+    (user_lat, user_lng): distances are measured from the user, venues more
+    than radius metres away are left out, visit state is cleared and the route
+    is planned again from the user's position.
+    """
+    venues = [dict(item) for item in itinerary if item["type"] == "venue"]
+    located = [
+        venue for venue in venues
+        if (venue.get("location") or {}).get("lat") is not None and (venue.get("location") or {}).get("lng") is not None
+    ]
+
+    for venue in venues:
+        venue["distance"] = float('inf')
+        venue["visit_start_time"] = None
+        venue["visit_end_time"] = None
+    if located:
+        distances = distances_from(
+            user_lat, user_lng,
+            [venue["location"]["lat"] for venue in located],
+            [venue["location"]["lng"] for venue in located],
+        )
+        for venue, distance in zip(located, distances.tolist()):
+            venue["distance"] = distance
+
+    # The template was searched from the cell centre, so part of it can be out of the user's radius
+    venues = [venue for venue in venues if venue["distance"] * 1000 <= float(radius)]
+    # The stored route starts at the cell centre, which can be far from the user
+    return order_venues(venues, user_lat, user_lng)
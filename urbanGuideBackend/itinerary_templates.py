@@ -0,0 +1,194 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.utils import timezone
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.cache import is_process_local_alias
+from urbanGuideBackend.geo import geohash_center, geohash_encode
+from urbanGuideBackend.itinerary import assemble_itinerary, enrich_places, order_venues, template_venues
+from urbanGuideBackend.models import ItineraryTemplate
+from urbanGuideBackend.search import find_places
+from urbanGuideBackend.travel_times import aget_leg_times, get_leg_times, get_travel_times
+
+# Itineraries for popular request shapes are built ahead of time by the
+# precompute_itineraries command, from the centre of the user's geohash cell,
+# and served to get_places re-routed from the user's position. Lookups count
+# demand in Django's cache rather than the database; the command adds the
+# counts to request_count before ranking the shapes.
+
+# Demand is counted by the web workers and read by the command, so it needs a cache they share
+if is_process_local_alias(settings.ITINERARY_TEMPLATES['DEMAND_CACHE_ALIAS']):
+    raise ImproperlyConfigured("ITINERARY_TEMPLATES DEMAND_CACHE_ALIAS needs a cache shared by every process")
+
+
+def template_key(lat, lng, radius, place_types, travel_mode, max_venues):
+    return {
+        "cell": geohash_encode(lat, lng, settings.ITINERARY_TEMPLATES['GEOHASH_PRECISION']),
+        "place_types": ",".join(sorted(set(place_types))),
+        "travel_mode": travel_mode,
+        "radius": int(float(radius)),
+        "max_venues": max_venues,
+    }
+
+
+def _demand_cache():
+    return caches[settings.ITINERARY_TEMPLATES['DEMAND_CACHE_ALIAS']]
+
+
+def _demand_key(template_id):
+    return f"itinerary_demand:{template_id}"
+
+
+def record_demand(template_id):
+    cache = _demand_cache()
+    key = _demand_key(template_id)
+    # Counters never expire; decay_demand deletes those of the shapes it drops
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted since the add
+            cache.add(key, 1, None)
+
+
+def _stored_leg_times(itinerary, venues):
+    """
+    Returns the travel time the stored itinerary has for each leg between
+    consecutive venues, or None for the legs it doesn't have.
+    """
+    # A travel item sits between the two venues it connects
+    stored = {
+        (itinerary[i - 1]["place_id"], itinerary[i + 1]["place_id"]): item["travel_time"]
+        for i, item in enumerate(itinerary)
+        if item["type"] == "travel" and item["travel_time"] != "Unknown"
+    }
+    return [stored.get((origin["place_id"], destination["place_id"])) for origin, destination in zip(venues, venues[1:])]
+
+
+def _load_template(lat, lng, radius, place_types, travel_mode, max_venues):
+    """
+    Returns the venues of the fresh template for the request, re-routed for
+    the user, with the stored travel time of each of their legs (None for new
+    pairs). Returns None if there is no such template.
+    """
+    key = template_key(lat, lng, radius, place_types, travel_mode, max_venues)
+    template = ItineraryTemplate.objects.filter(**key).values('pk', 'itinerary', 'built_at').first()
+    if template is None:
+        # The only write: a shape's first request
+        ItineraryTemplate.objects.bulk_create([ItineraryTemplate(request_count=1, **key)], ignore_conflicts=True)
+        return None
+
+    record_demand(template['pk'])
+    max_age = timedelta(seconds=settings.ITINERARY_TEMPLATES['MAX_AGE'])
+    if not template['itinerary'] or template['built_at'] < timezone.now() - max_age:
+        return None
+
+    venues = template_venues(template['itinerary'], lat, lng, radius)
+    if not venues:
+        return None
+    # Legs kept from the stored route are reused: the travel time cache may be per process, and
+    # then never holds what the precompute command fetched. Only the new pairs are looked up
+    return venues, _stored_leg_times(template['itinerary'], venues)
+
+
+def _missing_legs(venues, travel_times):
+    missing = [i for i, travel_time in enumerate(travel_times) if travel_time is None]
+    return missing, [venues[i]["location"] for i in missing], [venues[i + 1]["location"] for i in missing]
+
+
+def find_template(lat, lng, radius, place_types, travel_mode, max_venues):
+    """
+    Returns the precomputed itinerary for the request re-routed and re-timed
+    for the user, or None if there is no fresh one. Venues out of the user's
+    radius are dropped; if none are left, None is returned as well. Every lookup
+    counts as demand for the request's shape, which is what the precompute
+    command ranks by.
+    """
+    template = _load_template(lat, lng, radius, place_types, travel_mode, max_venues)
+    if template is None:
+        return None
+
+    venues, travel_times = template
+    missing, origins, destinations = _missing_legs(venues, travel_times)
+    for i, travel_time in zip(missing, get_leg_times(origins, destinations, travel_mode)):
+        travel_times[i] = travel_time
+    return assemble_itinerary(venues, travel_times, travel_mode)
+
+
+async def afind_template(lat, lng, radius, place_types, travel_mode, max_venues):
+    """
+    Async variant of find_template. Only the database lookup runs in a thread;
+    missing legs are fetched through the async client.
+    """
+    template = await sync_to_async(_load_template)(lat, lng, radius, place_types, travel_mode, max_venues)
+    if template is None:
+        return None
+
+    venues, travel_times = template
+    missing, origins, destinations = _missing_legs(venues, travel_times)
+    for i, travel_time in zip(missing, await aget_leg_times(origins, destinations, travel_mode)):
+        travel_times[i] = travel_time
+    return assemble_itinerary(venues, travel_times, travel_mode)
+
+
+def build_template(template):
+    """
+    Runs the get_places pipeline from the centre of the template's cell and
+    stores the itinerary. Returns False if no places were found.
+    """
+    lat, lng = geohash_center(template.cell)
+    place_types = template.place_types.split(",") if template.place_types else []
+    status_code, payload = find_places(lat, lng, template.radius, place_types, template.max_venues)
+    results = payload.get('results', [])[:template.max_venues] if status_code == 200 else []
+    if not results:
+        return False
+
+    venues = order_venues(enrich_places(results, lat, lng), lat, lng)
+    travel_times = get_travel_times([venue["location"] for venue in venues], template.travel_mode)
+    itinerary = assemble_itinerary(venues, travel_times, template.travel_mode)
+    for item in itinerary:
+        # Distances are measured from each user when served; JSON can't store an infinite one
+        if item["type"] == "venue":
+            item["distance"] = None
+
+    template.itinerary = itinerary
+    template.built_at = timezone.now()
+    template.save(update_fields=['itinerary', 'built_at'])
+    return True
+
+
+def flush_demand():
+    """
+    Adds the demand counted in the cache since the last run to request_count.
+    """
+    cache = _demand_cache()
+    templates = list(ItineraryTemplate.objects.only('pk', 'request_count'))
+    counts = cache.get_many([_demand_key(template.pk) for template in templates])
+    changed = []
+    for template in templates:
+        count = counts.get(_demand_key(template.pk))
+        if count:
+            # Decremented rather than deleted, so requests counted meanwhile aren't lost
+            cache.decr(_demand_key(template.pk), count)
+            template.request_count += count
+            changed.append(template)
+    ItineraryTemplate.objects.bulk_update(changed, ['request_count'], batch_size=500)
+
+
+def hot_templates(limit, min_requests):
+    return ItineraryTemplate.objects.filter(request_count__gte=min_requests).order_by('-request_count')[:limit]
+
+
+def decay_demand():
+    """
+    Halves every request count so demand reflects recent traffic, and drops
+    shapes nobody asks for any more.
+    """
+    ItineraryTemplate.objects.update(request_count=F('request_count') / 2)
+    dropped = list(ItineraryTemplate.objects.filter(request_count=0).values_list('pk', flat=True))
+    _demand_cache().delete_many([_demand_key(pk) for pk in dropped])
+    ItineraryTemplate.objects.filter(pk__in=dropped).delete()
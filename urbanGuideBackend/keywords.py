@@ -0,0 +1,43 @@
+# Keyword-to-Google-Places-type mapping
+KEYWORD_MAPPING = {
+    "Muzee și galerii de artă": "museum",
+    "Parcuri": "park",
+    "Grădini botanice": "botanical garden",
+    "Grădini zoologice": "zoo",
+    "Rezervații naturale": "natural feature",
+    "Monumente importante": "tourist attraction",
+    "Turnuri de observație": "point of interest",
+    "Biserici și catedrale vechi": "church",
+    "Piețe și târguri locale": "park",
+    "Centrul vechi al orașului": "neighborhood",
+    "Străzi pietonale cu arhitectură specifică": "street address",
+    "Plaje": "beach",
+    "Lacuri": "lake",
+    "Drumeții montane": "mountain",
+    "Cascade": "waterfall",
+    "Clădiri administrative sau faimoase": "point of interest",
+    "Primăria orașului": "local government office",
+    "Clădiri istorice guvernamentale": "government office",
+    "Biblioteci naționale": "library",
+    "Piețe de flori și piețe alimentare": "shopping mall",
+    "Piața centrală": "market",
+    "Bazaruri alimentare": "grocery or supermarket",
+    "Priveliști panoramice și puncte de observație": "panorama_points",
+    "Platforme de observare iluminate": "point_of_interest",
+    "Turnuri sau faruri cu vedere panoramică": "lighthouse",
+    "Poduri faimoase": "bridges",
+    "Piețe principale cu terase și cafenele": "cafe",
+    "Străzi pietonale cu artiști de stradă și târguri nocturne": "shopping_mall",
+    "Săli de operă": "opera",
+    "Teatre de comedie sau drame": "movie theater",
+    "Concerte de muzică live": "night club",
+    "Baruri pe acoperiș cu vedere panoramică": "bar",
+    "Pub-uri cu muzică live": "bar",
+    "Cluburi de noapte faimoase": "night_club",
+    "Casino-uri moderne": "casino",
+    "Baruri cu jocuri de societate": "bar",
+    "Proiecții de filme în aer liber": "movie_theater",
+    "Cinematografe nocturne drive-in": "movie_theater",
+    "Restaurante cu priveliște": "restaurant",
+    "Terase deschise pe acoperișuri sau lângă apă": "restaurant"
+}
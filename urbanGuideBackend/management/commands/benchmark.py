@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils.module_loading import import_string
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.benchmark import runner
+from urbanGuideBackend.benchmark.fake_google import FakeGoogleServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks every API route against a throwaway database and a local fake Google server, "
+        "and prints (or writes) per-endpoint throughput, latency percentiles and DB query counts as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help="Requests sent to each endpoint.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at a time.")
+        parser.add_argument('--users', type=int, default=20, help="Seeded users the requests are spread over.")
+        parser.add_argument('--schedules', type=int, default=5, help="Seeded schedules per user.")
+        parser.add_argument('--latency-ms', type=float, default=50, help="Fake Google response time.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of fake Google calls failing with HTTP 500.")
+        parser.add_argument(
+            '--endpoints', nargs='+', metavar='NAME',
+            help=f"Only run these endpoints. Available: {', '.join(scenario.name for scenario in runner.SCENARIOS)}.",
+        )
+        parser.add_argument(
+            '--clear-caches', action='store_true',
+            help=(
+                "Run against the configured Django caches, cleared first, instead of throwaway ones. "
+                "Clears everything stored in them, so never point this at a cache production uses."
+            ),
+        )
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument('--compare', metavar='BASELINE', help="A previous report to check for regressions.")
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help="Relative slowdown counted as a regression by --compare.",
+        )
+
+    @staticmethod
+    def isolated_caches(cache_root, run_id):
+        """
+        Returns a copy of CACHES the run can't share entries with: file caches
+        move into cache_root, other backends get a prefix unique to the run.
+        """
+        isolated = {}
+        for alias, config in settings.CACHES.items():
+            config = dict(config)
+            if issubclass(import_string(config['BACKEND']), FileBasedCache):
+                config['LOCATION'] = os.path.join(cache_root, alias)
+            else:
+                config['KEY_PREFIX'] = f"{config.get('KEY_PREFIX', '')}benchmark-{run_id}"
+            isolated[alias] = config
+        return isolated
+
+    def handle(self, *args, **options):
+        scenarios = runner.SCENARIOS
+        if options['endpoints']:
+            unknown = set(options['endpoints']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['endpoints']]
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        # Cached reads are keyed by user id, and the throwaway database reuses the ids of earlier runs,
+        # so the run must start from empty caches
+        cache_root = isolated_caches = None
+        if options['clear_caches']:
+            for cache in caches.all(initialized_only=False):
+                cache.clear()
+        else:
+            cache_root = tempfile.mkdtemp(prefix='benchmark-cache-')
+            isolated_caches = override_settings(CACHES=self.isolated_caches(cache_root, uuid.uuid4().hex[:8]))
+
+        server = FakeGoogleServer(latency_ms=options['latency_ms'], error_rate=options['error_rate']).start()
+        settings.GOOGLE_MAPS_API_BASE_URL = server.base_url
+        # Enables api/metrics/ for the run
+        if not settings.INSTRUMENTATION['METRICS_TOKEN']:
+            settings.INSTRUMENTATION['METRICS_TOKEN'] = uuid.uuid4().hex
+
+        # A file-backed test database: the in-memory one locks up under concurrent writers
+        if connection.vendor == 'sqlite':
+            fd, name = tempfile.mkstemp(suffix='.sqlite3', prefix='benchmark-')
+            os.close(fd)
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = name
+
+        # Uploaded pictures go to a throwaway media directory too
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        if isolated_caches is not None:
+            isolated_caches.enable()
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            context = runner.seed(options['users'], options['schedules'], uuid.uuid4().hex[:8])
+            report = runner.run(context, scenarios, options['requests'], options['concurrency'], meta={
+                "database": connection.vendor,
+                "fake_google": {"latency_ms": options['latency_ms'], "error_rate": options['error_rate']},
+                "users": options['users'],
+                "schedules_per_user": options['schedules'],
+            })
+            report["meta"]["fake_google"]["requests"] = server.requests
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            media.disable()
+            shutil.rmtree(media_root, ignore_errors=True)
+            if isolated_caches is not None:
+                isolated_caches.disable()
+                shutil.rmtree(cache_root, ignore_errors=True)
+            server.stop()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = runner.compare(baseline, report, options['threshold'])
+            for name, metric, before, after, change in regressions:
+                self.stderr.write(f"{name} {metric}: {before} -> {after} (+{change:.0%})")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
+            self.stderr.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.itinerary_templates import build_template, decay_demand, flush_demand, hot_templates
+
+
+class Command(BaseCommand):
+    help = "Precomputes itineraries for the most requested (cell, place types, travel mode) shapes. Run it off-peak."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=settings.ITINERARY_TEMPLATES['LIMIT'],
+            help="Number of request shapes to build, most requested first.",
+        )
+        parser.add_argument(
+            '--min-requests', type=int, default=settings.ITINERARY_TEMPLATES['MIN_REQUESTS'],
+            help="Only build shapes requested at least this many times since the last run.",
+        )
+        parser.add_argument(
+            '--no-decay', action='store_true',
+            help="Keep the request counts instead of halving them after the run.",
+        )
+
+    def handle(self, *args, **options):
+        # Demand counted by get_places since the last run
+        flush_demand()
+
+        built = failed = 0
+        for template in hot_templates(options['limit'], options['min_requests']):
+            try:
+                if build_template(template):
+                    built += 1
+                else:
+                    failed += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Failed to build {template}: {e}")
+
+        if not options['no_decay']:
+            decay_demand()
+        self.stdout.write(self.style.SUCCESS(f"Built {built} itineraries ({failed} failed)"))
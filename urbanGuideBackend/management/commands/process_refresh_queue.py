@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.refresh import process_queue
+
+
+class Command(BaseCommand):
+    help = "Runs the queued cache refresh tasks (CACHE_REFRESH MODE 'queue'), rate limited to CACHE_REFRESH QPS."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.CACHE_REFRESH['BATCH_SIZE'],
+            help="Tasks claimed at a time.",
+        )
+        parser.add_argument(
+            '--idle-sleep', type=float, default=5.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty instead of polling for new tasks.",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            count = process_queue(options['batch_size'])
+            processed += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['idle_sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} refresh tasks"))
@@ -15,6 +15,8 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="userprofile")
     name = models.CharField(max_length=100)
     userPicture = models.ImageField(upload_to="userPictures", null=True, blank=True)
+    # Size label -> stored name of each rendition of userPicture (see pictures.py), empty until built
+    picture_renditions = models.JSONField(default=dict, blank=True)
     test_field = models.CharField(max_length=50, default="test")  # Temporary field
 
     def __str__(self):
@@ -28,4 +30,124 @@ class UserSchedule(models.Model):
     visited_venues = models.JSONField(default=list)  # List of visited venues
     is_active = models.BooleanField(default=False)  # Marks if the schedule is active
     created_at = models.DateTimeField(default=now)
-    updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
+    updated_at = models.DateTimeField(auto_now=True)
+    # Trip progress, maintained on every visit update; venue_count is null until first computed
+    next_venue = models.ForeignKey('ScheduleVenue', on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    venue_count = models.PositiveIntegerField(null=True, blank=True)
+    visited_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the user + is_active lookups of the schedule endpoints
+            models.UniqueConstraint(fields=['user'], condition=models.Q(is_active=True), name='one_active_schedule_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+
+class ScheduleVenue(models.Model):
+    # One row per venue of a schedule; check-ins update these rows instead of the schedule JSON
+    schedule = models.ForeignKey(UserSchedule, on_delete=models.CASCADE, related_name="venues")
+    position = models.PositiveIntegerField()  # Index of the venue item in UserSchedule.schedule
+    place_id = models.CharField(max_length=255, null=True, blank=True)
+    name = models.CharField(max_length=255, null=True, blank=True)
+    visit_start_time = models.CharField(max_length=64, null=True, blank=True)  # Stored as sent by the client
+    visit_end_time = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'position'], name='unique_schedule_venue_position'),
+        ]
+        indexes = [
+            models.Index(fields=['place_id']),
+            models.Index(fields=['schedule', 'name']),
+        ]
+
+    def __str__(self):
+        return f"{self.schedule_id}:{self.position} {self.name}"
+
+class CachedEntry(models.Model):
+    # Backing table for the "database" cache backend in cache.py
+    namespace = models.CharField(max_length=50)
+    key = models.CharField(max_length=64)
+    value = models.JSONField()
+    expires_at = models.DateTimeField()
+    accessed_at = models.DateTimeField(default=now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['namespace', 'key'], name='unique_cache_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['namespace', 'accessed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.namespace}:{self.key}"
+
+
+class KnownPlace(models.Model):
+    # Local catalogue of venues seen in Nearby Search and Details responses
+    place_id = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
+    lat = models.FloatField()
+    lng = models.FloatField()
+    types = models.JSONField(default=list)  # Google place types
+    tags = models.JSONField(default=list)  # KEYWORD_MAPPING types the place was found for
+    vicinity = models.CharField(max_length=255, null=True, blank=True)
+    rating = models.FloatField(null=True, blank=True)
+    user_ratings_total = models.IntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lat', 'lng']),
+            models.Index(fields=['updated_at']),  # Incremental reloads of the catalogue index
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ItineraryTemplate(models.Model):
+    # Precomputed itinerary for one request shape: geohash cell, place types, travel mode, radius and venue count
+    cell = models.CharField(max_length=12)
+    place_types = models.CharField(max_length=255, blank=True)  # Sorted, comma separated
+    travel_mode = models.CharField(max_length=20)
+    radius = models.PositiveIntegerField()
+    max_venues = models.PositiveIntegerField()
+    itinerary = models.JSONField(null=True, blank=True)  # Null until precompute_itineraries builds it
+    request_count = models.PositiveIntegerField(default=0)  # Demand since the last precompute run
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cell', 'place_types', 'travel_mode', 'radius', 'max_venues'],
+                name='unique_itinerary_template',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['-request_count']),
+        ]
+
+    def __str__(self):
+        return f"{self.cell} {self.place_types or '*'} ({self.travel_mode})"
+
+
+class RefreshTask(models.Model):
+    # Queued background refresh of a cache entry (refresh.py), unique while queued or running
+    key = models.CharField(max_length=40, unique=True)
+    kind = models.CharField(max_length=50)
+    args = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.args}"
@@ -0,0 +1,149 @@
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.models import UserProfile
+from urbanGuideBackend.refresh import RateLimiter, RefreshWorker
+
+# Profile picture renditions. After an upload is saved, the picture is decoded
+# on a background pool, re-encoded without its metadata at every size in
+# PROFILE_PICTURES SIZES and stored under a name derived from its content, so
+# the files never change and can be cached for good. userPicture then points
+# at the largest rendition and the original upload is deleted. A picture that
+# can't be built is marked as failed so it isn't queued again.
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'userPictures/renditions'
+
+# Key of picture_renditions holding the name of a picture whose build failed
+FAILED = 'failed'
+
+# Its own pool and task kind, not limited to the Google refresh rate
+worker = RefreshWorker(
+    settings.PROFILE_PICTURES['MAX_WORKERS'],
+    RateLimiter(0),
+    handlers={'profile_picture': 'urbanGuideBackend.pictures.build_renditions'},
+    name='profile-pictures',
+)
+
+
+def _load(name):
+    with default_storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        # Checked before decoding (decompression bombs); Pillow only refuses twice its own MAX_IMAGE_PIXELS
+        width, height = image.size
+        if width * height > settings.PROFILE_PICTURES['MAX_PIXELS']:
+            raise ValueError(f"Picture too large: {width}x{height} pixels")
+        image.load()
+    # Applies the EXIF orientation before the EXIF block is dropped
+    image = ImageOps.exif_transpose(image)
+    return image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+
+def _encode(image, size):
+    rendition = image.copy()
+    rendition.thumbnail((size, size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    # No exif/icc arguments: the rendition carries no metadata
+    rendition.save(
+        output,
+        format=settings.PROFILE_PICTURES['FORMAT'],
+        quality=settings.PROFILE_PICTURES['QUALITY'],
+        method=4,
+    )
+    return output.getvalue()
+
+
+def _store(content):
+    extension = settings.PROFILE_PICTURES['FORMAT'].lower()
+    name = posixpath.join(RENDITIONS_DIR, f"{hashlib.sha256(content).hexdigest()[:20]}.{extension}")
+    if not default_storage.exists(name):
+        stored = default_storage.save(name, ContentFile(content))
+        if stored != name:
+            # Another build stored the same content since the check; the storage kept both under new names
+            default_storage.delete(stored)
+    return name
+
+
+def build_renditions(profile_id, original):
+    """
+    Builds and stores the renditions of the profile's picture original, then
+    records them on the profile, unless its picture changed in the meantime.
+    If the picture can't be built, it is marked as failed and the error re-raised.
+    """
+    sizes = settings.PROFILE_PICTURES['SIZES']
+    try:
+        image = _load(original)
+        renditions = {label: _store(_encode(image, size)) for label, size in sizes.items()}
+    except Exception:
+        UserProfile.objects.filter(pk=profile_id, userPicture=original).update(picture_renditions={FAILED: original})
+        raise
+    largest = renditions[max(sizes, key=sizes.get)]
+
+    updated = UserProfile.objects.filter(pk=profile_id, userPicture=original).update(
+        userPicture=largest,
+        picture_renditions=renditions,
+    )
+    if updated and original not in renditions.values():
+        default_storage.delete(original)
+    return renditions
+
+
+def schedule_renditions(profile):
+    """
+    Queues the renditions of the profile's current picture once the
+    surrounding transaction commits.
+    """
+    if not profile.userPicture:
+        return
+    args = [profile.pk, profile.userPicture.name]
+    transaction.on_commit(lambda: worker.submit('profile_picture', args))
+
+
+def build_failed(profile):
+    """
+    Returns whether building the renditions of the profile's current picture failed.
+    """
+    return bool(profile.userPicture) and (profile.picture_renditions or {}).get(FAILED) == profile.userPicture.name
+
+
+def _renditions(profile):
+    # Without the failure marker
+    sizes = settings.PROFILE_PICTURES['SIZES']
+    return {label: name for label, name in (profile.picture_renditions or {}).items() if label in sizes}
+
+
+def rendition_name(profile, label):
+    """
+    Returns the stored name of the profile picture at size label, or None
+    while the renditions aren't built (or label is unknown).
+    """
+    return _renditions(profile).get(label)
+
+
+def rendition_urls(profile, request=None):
+    # Absolute with a request, like DRF renders userPicture
+    urls = {label: default_storage.url(name) for label, name in _renditions(profile).items()}
+    if request is not None:
+        urls = {label: request.build_absolute_uri(url) for label, url in urls.items()}
+    return urls
+
+
+def is_rendition(name):
+    # Only content-named files are served as immutable
+    directory, filename = posixpath.split(name)
+    stem, _, extension = filename.partition('.')
+    return (
+        directory == RENDITIONS_DIR
+        and extension == settings.PROFILE_PICTURES['FORMAT'].lower()
+        and len(stem) == 20
+        and all(c in '0123456789abcdef' for c in stem)
+    )
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.utils.http import http_date
+
+from urbanGuideBackend import google_client, settings
+from urbanGuideBackend.cache import ResponseCache
+from urbanGuideBackend.catalogue import record_place_details
+from urbanGuideBackend.refresh import request_refresh
+
+
+# Details fields grouped by how quickly they change upstream. Each group is
+# refreshed on its own schedule so a stale rating doesn't refetch the photos.
+FIELD_GROUPS = {
+    'volatile': ['rating', 'reviews', 'opening_hours'],
+    'stable': ['name', 'formatted_address', 'formatted_phone_number', 'photos', 'editorial_summary', 'url', 'website', 'price_level'],
+}
+
+place_details_cache = ResponseCache('place_details', settings.PLACE_DETAILS_CACHE)
+
+
+def _details_params(place_id, fields):
+    return {
+        'place_id': place_id,
+        'fields': ','.join(fields),
+        'key': settings.GOOGLE_PLACES_API_KEY
+    }
+
+
+def format_details(place_details):
+    # Get up to 5 photos
+    photo_urls = []
+    photos = place_details.get("photos", [])[:5]  # Limit to 5 photos
+    for photo in photos:
+        photo_reference = photo.get("photo_reference")
+        if photo_reference:
+            photo_url = (
+                f"{settings.GOOGLE_MAPS_API_BASE_URL}/place/photo"
+                f"?maxwidth=800&photo_reference={photo_reference}&key={settings.GOOGLE_PLACES_API_KEY}"
+            )
+            photo_urls.append(photo_url)
+
+    return {
+        "name": place_details.get("name"),
+        "formatted_address": place_details.get("formatted_address"),
+        "formatted_phone_number": place_details.get("formatted_phone_number"),
+        "rating": place_details.get("rating"),
+        "photos": photo_urls,
+        "description": place_details.get("editorial_summary", {}).get("overview"),
+        "google_maps_url": place_details.get("url"),
+        "website": place_details.get("website"),
+        "opening_hours": place_details.get("opening_hours", {}).get("weekday_text"),
+        "price_level": place_details.get("price_level"),
+        "reviews": [{
+            "author_name": review.get("author_name"),
+            "rating": review.get("rating"),
+            "text": review.get("text"),
+            "time": review.get("relative_time_description")
+        } for review in place_details.get("reviews", [])]
+    }
+
+
+def _compute_etag(formatted):
+    raw = json.dumps(formatted, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _stale_groups(entry, now):
+    freshness = settings.PLACE_DETAILS_CACHE['FRESHNESS']
+    fetched_at = entry.get('fetched_at', {})
+    return [
+        group for group in FIELD_GROUPS
+        if group not in fetched_at or now - fetched_at[group] >= freshness[group]
+    ]
+
+
+def _stale_fields(stale_groups):
+    return [field for group in stale_groups for field in FIELD_GROUPS[group]]
+
+
+def set_validators(response, entry):
+    """
+    Adds the ETag/Last-Modified validators of a details entry to a response.
+    """
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _refresh_entry(place_id, entry, stale_groups, now, status_code, payload):
+    """
+    Merges a Details response for the stale field groups into the cached entry.
+    Returns (status_code, entry) as get_place_details does.
+    """
+    if status_code != 200:
+        # Serve the previous payload if we have a complete one
+        if 'formatted' in entry:
+            return 200, entry
+        return status_code, None
+
+    fields = _stale_fields(stale_groups)
+    merged = dict(entry['result'])
+    for field in fields:
+        merged.pop(field, None)
+    merged.update(payload.get('result', {}))
+
+    formatted = format_details(merged)
+    etag = _compute_etag(formatted)
+    entry = {
+        'result': merged,
+        'fetched_at': {**entry['fetched_at'], **{group: now for group in stale_groups}},
+        'formatted': formatted,
+        'etag': etag,
+        'last_modified': entry.get('last_modified', now) if etag == entry.get('etag') else now,
+    }
+    # Only cache answers Google actually resolved (not NOT_FOUND, INVALID_REQUEST, ...)
+    if payload.get('status') == 'OK':
+        place_details_cache.set(place_id, entry)
+        record_place_details(place_id, payload.get('result', {}))
+    return 200, entry
+
+
+def _fetch_stale_groups(place_id, entry, stale_groups, now):
+    try:
+        status_code, payload = google_client.get('details', _details_params(place_id, _stale_fields(stale_groups)))
+    except google_client.GoogleAPIUnavailable:
+        status_code, payload = 503, None
+    return _refresh_entry(place_id, entry, stale_groups, now, status_code, payload)
+
+
+def get_place_details(place_id):
+    """
+    Returns (status_code, entry) where entry holds the formatted details plus
+    their "etag" and "last_modified" (unix time). Only the field groups that
+    have outlived their freshness window are requested from Google; a place
+    already cached is served as is while those are refreshed in the background.
+    """
+    now = int(time.time())
+    entry = place_details_cache.get(place_id) or {'result': {}, 'fetched_at': {}}
+    stale_groups = _stale_groups(entry, now)
+    if not stale_groups:
+        return 200, entry
+    if 'formatted' in entry:
+        request_refresh('place_details', [place_id])
+        return 200, entry
+    return _fetch_stale_groups(place_id, entry, stale_groups, now)
+
+
+def refresh_place_details(place_id):
+    """
+    Refetches the stale field groups of a cached place (refresh task).
+    """
+    now = int(time.time())
+    entry = place_details_cache.get(place_id) or {'result': {}, 'fetched_at': {}}
+    stale_groups = _stale_groups(entry, now)
+    if stale_groups:
+        _fetch_stale_groups(place_id, entry, stale_groups, now)
+
+
+async def aget_place_details(place_id):
+    """
+    Async variant of get_place_details.
+    """
+    now = int(time.time())
+    entry = await sync_to_async(place_details_cache.get)(place_id) or {'result': {}, 'fetched_at': {}}
+    stale_groups = _stale_groups(entry, now)
+    if not stale_groups:
+        return 200, entry
+    if 'formatted' in entry:
+        await sync_to_async(request_refresh)('place_details', [place_id])
+        return 200, entry
+
+    try:
+        status_code, payload = await google_client.aget('details', _details_params(place_id, _stale_fields(stale_groups)))
+    except google_client.GoogleAPIUnavailable:
+        status_code, payload = 503, None
+    return await sync_to_async(_refresh_entry)(place_id, entry, stale_groups, now, status_code, payload)
@@ -0,0 +1,105 @@
+from asgiref.sync import sync_to_async
+
+from urbanGuideBackend import google_client, settings
+from urbanGuideBackend.cache import ResponseCache, make_key
+from urbanGuideBackend.catalogue import record_search_results
+from urbanGuideBackend.geo import geohash_center, geohash_encode
+from urbanGuideBackend.refresh import request_refresh
+
+nearby_search_cache = ResponseCache('nearby_search', settings.NEARBY_SEARCH_CACHE)
+
+
+def _nearby_cell(lat, lng):
+    return geohash_encode(lat, lng, settings.NEARBY_SEARCH_CACHE.get('GEOHASH_PRECISION', 6))
+
+
+def _refresh_args(lat, lng, radius, keyword):
+    # Refreshes name the cell's centre, so stale reads from anywhere in the cell queue the same task
+    cell_lat, cell_lng = geohash_center(_nearby_cell(lat, lng))
+    return [cell_lat, cell_lng, radius, keyword]
+
+
+def _nearby_query(lat, lng, radius, keyword, page, page_token):
+    """
+    Returns the cache key and request params for one Nearby Search page.
+
+    Searches are bucketed by geohash cell: every user inside the same cell
+    shares one upstream query centred on the cell, so identical keywords
+    from the same neighbourhood are answered from the cache.
+    """
+    cell = _nearby_cell(lat, lng)
+    key = make_key(cell, radius, keyword, page)
+    if page_token:
+        # Follow-up pages only take the token; Google ignores the other params
+        return key, {'key': settings.GOOGLE_PLACES_API_KEY, 'pagetoken': page_token}
+
+    cell_lat, cell_lng = geohash_center(cell)
+    params = {
+        'key': settings.GOOGLE_PLACES_API_KEY,
+        'location': f"{cell_lat},{cell_lng}",
+        'radius': radius,
+    }
+    if keyword:
+        params['keyword'] = keyword
+    return key, params
+
+
+def _is_cacheable(status_code, payload):
+    return status_code == 200 and payload.get('status') in ('OK', 'ZERO_RESULTS')
+
+
+def _fetch(key, params, keyword):
+    try:
+        status_code, payload = google_client.get('nearby_search', params)
+    except google_client.GoogleAPIUnavailable as e:
+        return 503, {'error_message': str(e)}
+    if _is_cacheable(status_code, payload):
+        nearby_search_cache.set(key, payload)
+        record_search_results(payload.get('results', []), [keyword] if keyword else [])
+    return status_code, payload
+
+
+def search_nearby(lat, lng, radius, keyword=None, page=0, page_token=None):
+    """
+    Runs a Nearby Search for a single keyword and returns (status_code, payload).
+    Pass the previous page's next_page_token and page number to fetch more results.
+    Stale cached pages are served while the first page is refreshed in the background.
+    """
+    key, params = _nearby_query(lat, lng, radius, keyword, page, page_token)
+
+    cached, stale = nearby_search_cache.get_stale(key)
+    if cached is not None:
+        if stale and not page_token:
+            request_refresh('nearby_search', _refresh_args(lat, lng, radius, keyword))
+        return 200, cached
+    return _fetch(key, params, keyword)
+
+
+async def asearch_nearby(lat, lng, radius, keyword=None, page=0, page_token=None):
+    """
+    Async variant of search_nearby.
+    """
+    key, params = _nearby_query(lat, lng, radius, keyword, page, page_token)
+
+    cached, stale = await sync_to_async(nearby_search_cache.get_stale)(key)
+    if cached is not None:
+        if stale and not page_token:
+            await sync_to_async(request_refresh)('nearby_search', _refresh_args(lat, lng, radius, keyword))
+        return 200, cached
+
+    try:
+        status_code, payload = await google_client.aget('nearby_search', params)
+    except google_client.GoogleAPIUnavailable as e:
+        return 503, {'error_message': str(e)}
+    if _is_cacheable(status_code, payload):
+        await sync_to_async(nearby_search_cache.set)(key, payload)
+        await sync_to_async(record_search_results)(payload.get('results', []), [keyword] if keyword else [])
+    return status_code, payload
+
+
+def refresh_nearby(lat, lng, radius, keyword):
+    """
+    Refetches the first Nearby Search page for a keyword (refresh task).
+    """
+    key, params = _nearby_query(lat, lng, radius, keyword, 0, None)
+    _fetch(key, params, keyword)
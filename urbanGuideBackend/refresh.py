@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.cache import make_key
+
+# Stale-while-revalidate for the Google-derived caches: requests serve a
+# stale entry right away and call request_refresh, which hands the refetch
+# to an in-process thread pool or, in 'queue' mode, to the DB-backed queue
+# drained by the process_refresh_queue command.
+
+logger = logging.getLogger(__name__)
+
+# Task kinds and the functions running them, called with the task's args
+HANDLERS = {
+    'nearby_search': 'urbanGuideBackend.places.refresh_nearby',
+    'travel_times': 'urbanGuideBackend.travel_times.refresh_legs',
+    'place_details': 'urbanGuideBackend.place_details.refresh_place_details',
+}
+
+
+class RateLimiter:
+    """
+    Spaces calls at least 1 / rate seconds apart across threads.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + 1 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+def task_key(kind, args):
+    return make_key(kind, args)
+
+
+def run_task(kind, args, limiter, handlers=HANDLERS):
+    limiter.acquire()
+    import_string(handlers[kind])(*args)
+
+
+class RefreshWorker:
+    """
+    In-process pool running refresh tasks, at most one per task key at a time.
+    Other modules may run their own task kinds on a worker of their own by
+    passing handlers (kind -> dotted path, like HANDLERS) and a thread name.
+    """
+
+    def __init__(self, max_workers, limiter, handlers=HANDLERS, name='cache-refresh'):
+        self.max_workers = max_workers
+        self.limiter = limiter
+        self.handlers = handlers
+        self.name = name
+        self._executor = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, args):
+        """
+        Queues a refresh. Returns False if the same one is already in flight.
+        """
+        key = task_key(kind, args)
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        self._executor.submit(self._run, key, kind, args)
+        return True
+
+    def _run(self, key, kind, args):
+        try:
+            run_task(kind, args, self.limiter, self.handlers)
+        except Exception:
+            logger.exception("Task %s%r failed", kind, args)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+            # Pool threads open their own DB connections for the caches and catalogue
+            connections.close_all()
+
+
+limiter = RateLimiter(settings.CACHE_REFRESH['QPS'])
+worker = RefreshWorker(settings.CACHE_REFRESH['MAX_WORKERS'], limiter)
+
+
+def request_refresh(kind, args):
+    """
+    Schedules a background refresh of one cache entry. Never raises: a failed
+    enqueue only means the stale entry is served a little longer.
+    """
+    try:
+        if settings.CACHE_REFRESH['MODE'] == 'queue':
+            from urbanGuideBackend.models import RefreshTask
+
+            # The unique key drops duplicates of tasks still queued or running
+            RefreshTask.objects.bulk_create(
+                [RefreshTask(key=task_key(kind, args), kind=kind, args=list(args))],
+                ignore_conflicts=True,
+            )
+        else:
+            worker.submit(kind, list(args))
+    except Exception:
+        logger.exception("Could not schedule refresh %s%r", kind, args)
+
+
+def claim_tasks(batch_size):
+    """
+    Marks up to batch_size queued tasks as claimed by this consumer and
+    returns them. Claims older than CLAIM_TIMEOUT are taken over, so tasks
+    of a crashed consumer are retried.
+    """
+    from urbanGuideBackend.models import RefreshTask
+
+    expired = timezone.now() - timedelta(seconds=settings.CACHE_REFRESH['CLAIM_TIMEOUT'])
+    with transaction.atomic():
+        tasks = RefreshTask.objects.filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired)).order_by('created_at')
+        if connection.features.has_select_for_update_skip_locked:
+            tasks = tasks.select_for_update(skip_locked=True)
+        tasks = list(tasks[:batch_size])
+        RefreshTask.objects.filter(pk__in=[task.pk for task in tasks]).update(claimed_at=timezone.now())
+    return tasks
+
+
+def process_queue(batch_size):
+    """
+    Runs one batch of queued refresh tasks. Returns the number processed.
+    """
+    tasks = claim_tasks(batch_size)
+    for task in tasks:
+        try:
+            run_task(task.kind, task.args, limiter)
+        except Exception:
+            logger.exception("Refresh %s%r failed", task.kind, task.args)
+        # Dropped even on failure; the next stale read queues it again
+        task.delete()
+    return len(tasks)
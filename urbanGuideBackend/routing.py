@@ -0,0 +1,117 @@
+import time
+
+
+def path_cost(matrix, order):
+    return sum(matrix[order[i]][order[i + 1]] for i in range(len(order) - 1))
+
+
+def _nearest_neighbour(matrix, start, nodes):
+    order = [start]
+    remaining = set(nodes)
+    remaining.discard(start)
+    while remaining:
+        last = order[-1]
+        closest = min(remaining, key=lambda node: matrix[last][node])
+        order.append(closest)
+        remaining.remove(closest)
+    return order
+
+
+def _two_opt(matrix, order, first, last, deadline):
+    """
+    Reverses order[i..j] whenever that shortens the open path. Positions
+    before first and after last are fixed. The matrix is assumed symmetric,
+    so only the two edges around the reversed segment change.
+    """
+    n = len(order)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(first, last):
+            for j in range(i + 1, last + 1):
+                old_cost = new_cost = 0
+                if i > 0:
+                    old_cost += matrix[order[i - 1]][order[i]]
+                    new_cost += matrix[order[i - 1]][order[j]]
+                if j < n - 1:
+                    old_cost += matrix[order[j]][order[j + 1]]
+                    new_cost += matrix[order[i]][order[j + 1]]
+                if new_cost < old_cost - 1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return order
+
+
+def _or_opt(matrix, order, first, last, deadline):
+    """
+    Moves runs of 1-3 consecutive stops to a cheaper position, keeping
+    positions before first and after last fixed.
+    """
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        best_cost = path_cost(matrix, order)
+        for length in (1, 2, 3):
+            for i in range(first, last - length + 2):
+                segment = order[i:i + length]
+                rest = order[:i] + order[i + length:]
+                # Insertion points that keep the fixed prefix and suffix in place
+                for position in range(first, last - length + 2):
+                    if position == i:
+                        continue
+                    candidate = rest[:position] + segment + rest[position:]
+                    cost = path_cost(matrix, candidate)
+                    if cost < best_cost - 1e-9:
+                        order, best_cost = candidate, cost
+                        improved = True
+                        break
+                if improved or time.perf_counter() >= deadline:
+                    break
+            if improved or time.perf_counter() >= deadline:
+                break
+    return order
+
+
+def plan_route(matrix, start=None, end=None, time_budget_ms=20):
+    """
+    Orders the nodes of a symmetric pairwise cost matrix into a short open path using
+    nearest neighbour construction followed by 2-opt and Or-opt improvement.
+
+    start and end optionally pin the first and last node. The improvement
+    phases stop once time_budget_ms has elapsed and return the best order so far.
+    """
+    n = len(matrix)
+    if n <= 2:
+        order = list(range(n))
+        if start is not None and order and order[0] != start:
+            order.reverse()
+        if end is not None and order and order[-1] != end:
+            order.reverse()
+        return order
+
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    nodes = [node for node in range(n) if node != end]
+
+    # Without a fixed start, keep the best nearest-neighbour tour over every starting node
+    starts = [start] if start is not None else nodes
+    order = None
+    for candidate_start in starts:
+        candidate = _nearest_neighbour(matrix, candidate_start, nodes)
+        if end is not None:
+            candidate.append(end)
+        if order is None or path_cost(matrix, candidate) < path_cost(matrix, order):
+            order = candidate
+        if time.perf_counter() >= deadline:
+            break
+
+    first = 1 if start is not None else 0
+    last = n - 2 if end is not None else n - 1
+    while time.perf_counter() < deadline:
+        cost = path_cost(matrix, order)
+        order = _two_opt(matrix, order, first, last, deadline)
+        order = _or_opt(matrix, order, first, last, deadline)
+        if path_cost(matrix, order) >= cost - 1e-9:
+            break
+    return order
@@ -0,0 +1,297 @@
+import base64
+import json
+import uuid
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from urbanGuideBackend import settings
+from urbanGuideBackend.cache import ResponseCache, is_process_local, make_key
+from urbanGuideBackend.models import ScheduleVenue, UserSchedule
+
+# Visit state lives in ScheduleVenue rows, one per venue item of a schedule.
+# UserSchedule.schedule keeps the itinerary as planned; the JSON shape the
+# clients expect is rebuilt from both only when a schedule is read.
+
+VISIT_FIELDS = ('visit_start_time', 'visit_end_time')
+
+# Visit event types accepted by apply_visit_events
+EVENT_FIELDS = {'check_in': 'visit_start_time', 'check_out': 'visit_end_time'}
+
+# Responses of the polled schedule endpoints, keyed by user and read version
+schedule_read_cache = ResponseCache('schedule_reads', settings.SCHEDULE_READ_CACHE)
+
+# Invalidations must reach every worker, or the others keep serving reads cached before a write
+if is_process_local(schedule_read_cache.backend):
+    raise ImproperlyConfigured("SCHEDULE_READ_CACHE needs a cache shared by the worker processes")
+
+
+def _version_key(user_id):
+    return make_key('version', user_id)
+
+
+def cached_read(user, name, load):
+    """
+    Returns the (status_code, payload) of load() for the user's read called
+    name, cached until invalidate_reads runs for that user.
+    """
+    # Every write gives the user a fresh version, so reads never see entries cached before it
+    version = schedule_read_cache.backend.get(_version_key(user.pk))
+    if version is None:
+        version = uuid.uuid4().hex
+        schedule_read_cache.backend.set(_version_key(user.pk), version, schedule_read_cache.ttl)
+
+    key = make_key(name, user.pk, version)
+    cached = schedule_read_cache.get(key)
+    if cached is not None:
+        return cached["status_code"], cached["payload"]
+
+    status_code, payload = load()
+    schedule_read_cache.set(key, {"status_code": status_code, "payload": payload})
+    return status_code, payload
+
+
+def invalidate_reads(user_id):
+    # Bumped after commit so a read racing the write can't cache the old rows under the new version
+    transaction.on_commit(
+        lambda: schedule_read_cache.backend.set(_version_key(user_id), uuid.uuid4().hex, schedule_read_cache.ttl)
+    )
+
+
+def get_schedule(user, schedule_id=None, for_update=False):
+    """
+    Returns the user's schedule with schedule_id, or the active one if no id is given.
+    With for_update the row stays locked until the surrounding transaction ends.
+    """
+    schedules = UserSchedule.objects.filter(user=user)
+    if for_update:
+        schedules = schedules.select_for_update()
+    if schedule_id:
+        return schedules.filter(schedule_id=schedule_id).first()
+    return schedules.filter(is_active=True).first()
+
+
+def _venue_rows(schedule):
+    rows = []
+    for position, item in enumerate(schedule.schedule or []):
+        if item.get("type") != "venue":
+            continue
+        rows.append(ScheduleVenue(
+            schedule=schedule,
+            position=position,
+            place_id=item.get("place_id"),
+            name=item.get("name"),
+            visit_start_time=_as_visit_time(item.get("visit_start_time")),
+            visit_end_time=_as_visit_time(item.get("visit_end_time")),
+        ))
+    return rows
+
+
+def _as_visit_time(value):
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def create_schedule(user, title, schedule):
+    """
+    Creates a new active schedule with its venue rows, deactivating the
+    user's previous active schedule in the same transaction.
+    """
+    try:
+        return _create_schedule(user, title, schedule)
+    except IntegrityError:
+        # A concurrent create activated its schedule after our UPDATE ran; deactivate that one too
+        return _create_schedule(user, title, schedule)
+
+
+def _create_schedule(user, title, schedule):
+    with transaction.atomic():
+        # Writes first, so no lock is needed up front: the UPDATE locks the active row, and a create
+        # racing past it is rejected by the one_active_schedule_per_user constraint
+        UserSchedule.objects.filter(user=user, is_active=True).update(is_active=False)
+        new_schedule = UserSchedule.objects.create(
+            user=user,
+            title=title,
+            schedule=schedule,
+            is_active=True,
+        )
+        venues = ScheduleVenue.objects.bulk_create(_venue_rows(new_schedule))
+        if venues and venues[0].pk is None:
+            # Backends without RETURNING don't set primary keys on bulk_create
+            venues = list(new_schedule.venues.order_by('position'))
+        save_progress(new_schedule, venues)
+        invalidate_reads(user.pk)
+    return new_schedule
+
+
+def ensure_venue_rows(schedule):
+    # Schedules created before the venue table existed get their rows on first check-in
+    ScheduleVenue.objects.bulk_create(_venue_rows(schedule), ignore_conflicts=True)
+
+
+def apply_visit_events(user, events, schedule_id=None):
+    """
+    Applies a batch of visit events, e.g. check-ins queued by an offline
+    client, to one schedule in a single transaction. Each event is a dict
+    with type ('check_in' or 'check_out'), venue_name or place_id, and an
+    optional time. Events are applied in order, so a later event for the same
+    venue wins. Returns the indexes of events matching no venue, or None if
+    the schedule does not exist.
+    """
+    for event in events:
+        if event.get("type") not in EVENT_FIELDS:
+            raise ValueError(f"Unknown visit event type: {event.get('type')}")
+
+    with transaction.atomic():
+        # Lock the schedule so concurrent batches for it are applied one after another
+        schedule = get_schedule(user, schedule_id, for_update=True)
+        if schedule is None:
+            return None
+
+        venues = list(schedule.venues.order_by('position'))
+        if not venues:
+            ensure_venue_rows(schedule)
+            venues = list(schedule.venues.order_by('position'))
+
+        # The first venue in itinerary order wins, as with single check-ins
+        by_place_id, by_name = {}, {}
+        for venue in venues:
+            by_place_id.setdefault(venue.place_id, venue)
+            by_name.setdefault(venue.name, venue)
+
+        now = timezone.now()
+        changed = {}
+        skipped = []
+        for index, event in enumerate(events):
+            place_id = event.get("place_id")
+            venue = by_place_id.get(place_id) if place_id else by_name.get(event.get("venue_name"))
+            if venue is None:
+                skipped.append(index)
+                continue
+            setattr(venue, EVENT_FIELDS[event["type"]], _as_visit_time(event.get("time") or now))
+            changed[venue.pk] = venue
+
+        # One UPDATE for every touched row
+        ScheduleVenue.objects.bulk_update(changed.values(), VISIT_FIELDS)
+        if changed or schedule.venue_count is None:
+            save_progress(schedule, venues)
+            invalidate_reads(user.pk)
+    return skipped
+
+
+def save_progress(schedule, venues):
+    """
+    Stores the next venue (the first one not checked out, in itinerary order)
+    and the progress counters on the schedule. venues must be in position order.
+    """
+    schedule.next_venue = next((venue for venue in venues if not venue.visit_end_time), None)
+    schedule.venue_count = len(venues)
+    schedule.visited_count = sum(1 for venue in venues if venue.visit_end_time)
+    schedule.save(update_fields=['next_venue', 'venue_count', 'visited_count', 'updated_at'])
+
+
+def ensure_progress(schedule):
+    # Progress of schedules created before it was tracked is computed once
+    if schedule.venue_count is None:
+        ensure_venue_rows(schedule)
+        save_progress(schedule, list(schedule.venues.order_by('position')))
+
+
+def get_next_venue(schedule):
+    """
+    Returns the schedule item of the venue being visited or next to visit, or
+    None once every venue is visited. Load schedules with
+    select_related('next_venue') to answer this without further queries.
+    """
+    ensure_progress(schedule)
+    if schedule.next_venue is None:
+        return None
+    return _venue_item(schedule.schedule[schedule.next_venue.position], schedule.next_venue)
+
+
+def _encode_cursor(schedule):
+    position = json.dumps([schedule.created_at.isoformat(), schedule.pk])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = parse_datetime(created_at)
+    except (TypeError, ValueError):
+        created_at = None
+    if created_at is None:
+        raise ValueError("Invalid cursor")
+    return created_at, int(pk)
+
+
+def _history_queryset(user, cursor, include_schedule):
+    queryset = UserSchedule.objects.filter(user=user).order_by('-created_at', '-pk')
+    if cursor:
+        created_at, pk = _decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    if include_schedule:
+        return queryset.prefetch_related('venues')
+    return queryset.defer('schedule', 'visited_venues')
+
+
+def _summary(schedule, include_schedule):
+    ensure_progress(schedule)
+    summary = {
+        "schedule_id": str(schedule.schedule_id),
+        "title": schedule.title,
+        "is_active": schedule.is_active,
+        "created_at": schedule.created_at,
+        "updated_at": schedule.updated_at,
+        "venue_count": schedule.venue_count,
+        "visited_count": schedule.visited_count,
+    }
+    if include_schedule:
+        summary["schedule"] = build_schedule(schedule)
+    return summary
+
+
+def get_history(user, cursor=None, limit=20, include_schedule=False):
+    """
+    Returns one page of the user's schedules, newest first, as
+    (summaries, next_cursor). Pages are read by keyset on (created_at, id)
+    so any page costs the same however long the history is. Itinerary
+    bodies are only loaded and returned with include_schedule.
+    """
+    # One extra row tells whether there is a next page
+    page = list(_history_queryset(user, cursor, include_schedule)[:limit + 1])
+    next_cursor = _encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return [_summary(schedule, include_schedule) for schedule in page[:limit]], next_cursor
+
+
+def iter_history(user, cursor=None, include_schedule=False):
+    """
+    Returns an iterator over the summaries of all the user's schedules after
+    cursor, newest first, reading the rows in chunks so memory stays bounded.
+    """
+    # Built eagerly so an invalid cursor fails before a response starts streaming
+    queryset = _history_queryset(user, cursor, include_schedule)
+    chunk_size = settings.SCHEDULE_HISTORY['STREAM_CHUNK_SIZE']
+    return (_summary(schedule, include_schedule) for schedule in queryset.iterator(chunk_size=chunk_size))
+
+
+def build_schedule(schedule, venues=None):
+    """
+    Returns schedule.schedule with the visit times of its venue rows applied.
+    venues may be passed in when they were already fetched (e.g. prefetched).
+    """
+    items = list(schedule.schedule or [])
+    if venues is None:
+        venues = schedule.venues.all()
+    for venue in venues:
+        if venue.position < len(items):
+            items[venue.position] = _venue_item(items[venue.position], venue)
+    return items
+
+
+def _venue_item(item, venue):
+    return dict(item, visit_start_time=venue.visit_start_time, visit_end_time=venue.visit_end_time)
@@ -0,0 +1,189 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from urbanGuideBackend import instrumentation, settings
+from urbanGuideBackend.catalogue import find_candidates
+from urbanGuideBackend.geo import distances_from
+from urbanGuideBackend.places import asearch_nearby, search_nearby
+
+# Search planner for get_places: the local catalogue first, then one Nearby
+# Search per mapped place type it can't fill, run concurrently; results are
+# merged by place_id and ranked by a combined score.
+
+
+def _keywords(place_types):
+    # No mapped types means a single unfiltered search
+    return sorted(set(place_types)) or [None]
+
+
+def score_places(places, lat, lng, radius):
+    """
+    Sorts places by a weighted score of rating, review count (log-scaled
+    against the best candidate) and distance from the user relative to radius.
+    """
+    if not places:
+        return []
+    weights = settings.PLACE_SEARCH['SCORE_WEIGHTS']
+    radius_km = float(radius) / 1000
+    locations = [place.get("geometry", {}).get("location", {}) for place in places]
+    located = [i for i, location in enumerate(locations) if location.get("lat") is not None and location.get("lng") is not None]
+
+    # Places without a location get the full distance penalty
+    distances = [radius_km] * len(places)
+    if located:
+        located_distances = distances_from(
+            lat, lng,
+            [locations[i]["lat"] for i in located],
+            [locations[i]["lng"] for i in located],
+        )
+        for i, distance in zip(located, located_distances.tolist()):
+            distances[i] = distance
+    max_reviews = math.log1p(max(place.get("user_ratings_total") or 0 for place in places)) or 1
+
+    def score(index):
+        place = places[index]
+        return (
+            weights['rating'] * (place.get("rating") or 0) / 5
+            + weights['popularity'] * math.log1p(place.get("user_ratings_total") or 0) / max_reviews
+            - weights['distance'] * min(distances[index] / radius_km, 1)
+        )
+
+    return [places[index] for index in sorted(range(len(places)), key=score, reverse=True)]
+
+
+def _merge(result_lists):
+    merged = {}
+    for results in result_lists:
+        for place in results:
+            if place.get("place_id") and place["place_id"] not in merged:
+                merged[place["place_id"]] = place
+    return list(merged.values())
+
+
+def _page_delay(deadline):
+    # Google only accepts a next_page_token after a short delay; skip it if that breaks the budget
+    delay = settings.PLACE_SEARCH['PAGE_TOKEN_DELAY']
+    return delay if time.perf_counter() + delay < deadline else None
+
+
+def _search_keyword(lat, lng, radius, keyword, limit, deadline):
+    status_code, payload = search_nearby(lat, lng, radius, keyword)
+    if status_code != 200:
+        return status_code, payload, []
+
+    results = list(payload.get('results', []))
+    page = 0
+    page_token = payload.get('next_page_token')
+    while page_token and len(results) < limit and page < settings.PLACE_SEARCH['MAX_PAGES'] - 1:
+        delay = _page_delay(deadline)
+        if delay is None:
+            break
+        time.sleep(delay)
+        page += 1
+        page_status, page_payload = search_nearby(lat, lng, radius, keyword, page=page, page_token=page_token)
+        if page_status != 200 or page_payload.get('status') != 'OK':
+            break
+        results.extend(page_payload.get('results', []))
+        page_token = page_payload.get('next_page_token')
+    return status_code, payload, results
+
+
+async def _asearch_keyword(lat, lng, radius, keyword, limit, deadline, semaphore):
+    async with semaphore:
+        status_code, payload = await asearch_nearby(lat, lng, radius, keyword)
+    if status_code != 200:
+        return status_code, payload, []
+
+    results = list(payload.get('results', []))
+    page = 0
+    page_token = payload.get('next_page_token')
+    while page_token and len(results) < limit and page < settings.PLACE_SEARCH['MAX_PAGES'] - 1:
+        delay = _page_delay(deadline)
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+        page += 1
+        async with semaphore:
+            page_status, page_payload = await asearch_nearby(lat, lng, radius, keyword, page=page, page_token=page_token)
+        if page_status != 200 or page_payload.get('status') != 'OK':
+            break
+        results.extend(page_payload.get('results', []))
+        page_token = page_payload.get('next_page_token')
+    return status_code, payload, results
+
+
+def _search_keyword_in_worker(*args):
+    try:
+        return _search_keyword(*args)
+    finally:
+        # Worker threads open their own DB connections for the caches and catalogue
+        connections.close_all()
+
+
+def _combine(outcomes, catalogue_results, lat, lng, radius):
+    """
+    Builds the (status_code, payload) answer from the per-keyword outcomes.
+    Fails only if every search failed and the catalogue had nothing either.
+    """
+    succeeded = [results for status_code, _, results in outcomes if status_code == 200]
+    if not succeeded and not catalogue_results:
+        status_code, payload, _ = outcomes[0]
+        return status_code, payload
+    results = score_places(_merge([catalogue_results] + succeeded), lat, lng, radius)
+    return 200, {'status': 'OK', 'results': results}
+
+
+def _plan(lat, lng, radius, place_types, limit):
+    """
+    Returns the catalogue candidates for the request and the keywords Google
+    still has to be searched for. Each place type should supply its share of
+    limit; only the types the catalogue can't fill are searched.
+    """
+    keywords = _keywords(place_types)
+    share = math.ceil(limit / len(keywords))
+    found = [find_candidates(lat, lng, radius, [keyword], share) if keyword else [] for keyword in keywords]
+    short = [keyword for keyword, results in zip(keywords, found) if len(results) < share]
+    return _merge(found), short
+
+
+def find_places(lat, lng, radius, place_types, limit):
+    """
+    Returns (status_code, payload) with up to limit ranked candidates.
+    Places come from the local catalogue first; Google is only asked for the
+    place types it holds too few matches of, with one concurrent search per type.
+    """
+    catalogue_results, keywords = _plan(lat, lng, radius, place_types, limit)
+    if not keywords:
+        return 200, {'status': 'OK', 'results': score_places(catalogue_results, lat, lng, radius)}
+
+    options = settings.PLACE_SEARCH
+    deadline = time.perf_counter() + options['LATENCY_BUDGET_MS'] / 1000
+    with ThreadPoolExecutor(max_workers=min(options['MAX_CONCURRENT_SEARCHES'], len(keywords))) as executor:
+        outcomes = list(executor.map(
+            instrumentation.bind(lambda keyword: _search_keyword_in_worker(lat, lng, radius, keyword, limit, deadline)),
+            keywords,
+        ))
+    return _combine(outcomes, catalogue_results, lat, lng, radius)
+
+
+async def afind_places(lat, lng, radius, place_types, limit):
+    """
+    Async variant of find_places.
+    """
+    catalogue_results, keywords = await sync_to_async(_plan)(lat, lng, radius, place_types, limit)
+    if not keywords:
+        return 200, {'status': 'OK', 'results': score_places(catalogue_results, lat, lng, radius)}
+
+    options = settings.PLACE_SEARCH
+    deadline = time.perf_counter() + options['LATENCY_BUDGET_MS'] / 1000
+    semaphore = asyncio.Semaphore(options['MAX_CONCURRENT_SEARCHES'])
+    outcomes = await asyncio.gather(*(
+        _asearch_keyword(lat, lng, radius, keyword, limit, deadline, semaphore)
+        for keyword in keywords
+    ))
+    return _combine(list(outcomes), catalogue_results, lat, lng, radius)
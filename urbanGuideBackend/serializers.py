@@ -1,12 +1,19 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from . import accounts, pictures
 from .models import UserProfile
 
 # Serializer for creating/updating profiles
 class UserProfileSerializer(serializers.ModelSerializer):
+    # URL per size label of the picture's renditions, empty while they are being built
+    userPictureRenditions = serializers.SerializerMethodField()
+
     class Meta:
         model = UserProfile
-        fields = ['name', 'userPicture']
+        fields = ['name', 'userPicture', 'userPictureRenditions']
+
+    def get_userPictureRenditions(self, profile):
+        return pictures.rendition_urls(profile, self.context.get('request'))
 
 # Serializer for user registration (account creation)
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -16,17 +23,23 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data.get('email', ''),
-            password=validated_data['password']
-        )
-        return user
+        try:
+            return accounts.register(
+                validated_data['username'],
+                validated_data.get('email', ''),
+                validated_data['password'],
+            )
+        except accounts.UsernameTaken as e:
+            raise serializers.ValidationError({'username': str(e)}) from e
 
 class UserProfileGetSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
+    userPictureRenditions = serializers.SerializerMethodField()
     
     class Meta:
         model = UserProfile
-        fields = ['username', 'email', 'name', 'userPicture']
+        fields = ['username', 'email', 'name', 'userPicture', 'userPictureRenditions']
+
+    def get_userPictureRenditions(self, profile):
+        return pictures.rendition_urls(profile, self.context.get('request'))
@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
-from decouple import config
+from decouple import Csv, config
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -29,6 +29,167 @@ DEBUG = config('DEBUG', default=False, cast=bool)
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '192.168.56.1', '192.168.242.48']
 GOOGLE_PLACES_API_KEY = config('GOOGLE_PLACES_API_KEY')
+GOOGLE_MAPS_API_BASE_URL = config('GOOGLE_MAPS_API_BASE_URL', default='https://maps.googleapis.com/maps/api')
+# Shared Google API client (google_client.py): connection pool, timeouts in seconds, retries and circuit breaker
+GOOGLE_API_CLIENT = {
+    'POOL_CONNECTIONS': 4,
+    'POOL_MAXSIZE': config('GOOGLE_API_POOL_MAXSIZE', default=20, cast=int),
+    'CONNECT_TIMEOUT': config('GOOGLE_API_CONNECT_TIMEOUT', default=3.0, cast=float),
+    'READ_TIMEOUT': config('GOOGLE_API_READ_TIMEOUT', default=10.0, cast=float),
+    'MAX_RETRIES': config('GOOGLE_API_MAX_RETRIES', default=2, cast=int),
+    'BACKOFF_FACTOR': 0.2,
+    'CIRCUIT_FAILURE_THRESHOLD': config('GOOGLE_API_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int),
+    'CIRCUIT_RESET_TIMEOUT': config('GOOGLE_API_CIRCUIT_RESET_TIMEOUT', default=30, cast=int),
+}
+# Django's cache, shared by the worker processes of one host through files in LOCATION. Workers on
+# several hosts need a networked cache here (e.g. CACHE_BACKEND=...redis.RedisCache, CACHE_LOCATION=redis://...)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='urbanGuideBackend.cache.AmortizedFileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+        # No default expiry: the file cache's incr() stores counters again with it, and all other entries have their own
+        'TIMEOUT': None,
+        # The file cache drops a random third of its entries past MAX_ENTRIES (Django's default is 300).
+        # Checking the size lists the whole directory, so it only happens every CULL_INTERVAL writes;
+        # that listing still grows with MAX_ENTRIES, so keep it modest or use Redis/Memcached for larger caches
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int),
+            'CULL_INTERVAL': config('CACHE_CULL_INTERVAL', default=100, cast=int),
+        },
+    }
+}
+# Coalescing of identical concurrent Google calls (singleflight.py). With CROSS_PROCESS they are also
+# shared between worker processes through a lock in the CACHE_ALIAS cache, which must be shared by them
+SINGLE_FLIGHT = {
+    'CROSS_PROCESS': config('SINGLE_FLIGHT_CROSS_PROCESS', default=False, cast=bool),
+    'CACHE_ALIAS': 'default',
+    'LOCK_TIMEOUT': 30,  # Longest wait for another process's call, in seconds
+    'RESULT_TTL': 2,
+    'POLL_INTERVAL': 0.05,
+}
+# Upper bound for the "max_venues" itinerary option (one Nearby Search page holds 20 results)
+MAX_ITINERARY_VENUES = 20
+# Time budget of the route improvement phase in routing.plan_route
+ROUTE_OPTIMIZATION_TIME_BUDGET_MS = config('ROUTE_OPTIMIZATION_TIME_BUDGET_MS', default=20, cast=int)
+# How missing legs are fetched. 'batched' sends one origins x destinations matrix per 10 legs: fewer
+# requests and less latency, but Google bills every element, so n legs cost n*n elements (49 for 7 legs).
+# 'single' sends one concurrent 1x1 request per leg: n requests billed as n elements
+DISTANCE_MATRIX_MODE = config('DISTANCE_MATRIX_MODE', default='batched')
+# Max concurrent single-leg Distance Matrix requests ('single' mode, or when a batched matrix call fails)
+DISTANCE_MATRIX_MAX_WORKERS = config('DISTANCE_MATRIX_MAX_WORKERS', default=4, cast=int)
+# Pooled keep-alive client used by the async Google-backed views (timeouts in seconds)
+ASYNC_HTTP_CLIENT = {
+    'MAX_CONNECTIONS': config('ASYNC_HTTP_MAX_CONNECTIONS', default=100, cast=int),
+    'MAX_KEEPALIVE_CONNECTIONS': config('ASYNC_HTTP_MAX_KEEPALIVE_CONNECTIONS', default=20, cast=int),
+    'MAX_CONNECTIONS_PER_HOST': config('ASYNC_HTTP_MAX_CONNECTIONS_PER_HOST', default=50, cast=int),
+    'KEEPALIVE_EXPIRY': 30.0,
+    'CONNECT_TIMEOUT': config('ASYNC_HTTP_CONNECT_TIMEOUT', default=3.0, cast=float),
+    'READ_TIMEOUT': config('ASYNC_HTTP_READ_TIMEOUT', default=10.0, cast=float),
+}
+# Nearby Search results cache. BACKEND is one of "memory", "database" or "django"
+NEARBY_SEARCH_CACHE = {
+    'BACKEND': config('NEARBY_SEARCH_CACHE_BACKEND', default='memory'),
+    'TTL': config('NEARBY_SEARCH_CACHE_TTL', default=60 * 60 * 24, cast=int),
+    'MAX_ENTRIES': config('NEARBY_SEARCH_CACHE_MAX_ENTRIES', default=5000, cast=int),
+    'STALE_TTL': config('NEARBY_SEARCH_CACHE_STALE_TTL', default=60 * 60 * 24 * 7, cast=int),  # Served while refreshed
+    'GEOHASH_PRECISION': 6,
+}
+# Per-leg travel time cache, keyed by snapped origin/destination and travel mode
+TRAVEL_TIME_CACHE = {
+    'BACKEND': config('TRAVEL_TIME_CACHE_BACKEND', default='memory'),
+    'TTL': config('TRAVEL_TIME_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int),
+    'MAX_ENTRIES': config('TRAVEL_TIME_CACHE_MAX_ENTRIES', default=50000, cast=int),
+    'STALE_TTL': config('TRAVEL_TIME_CACHE_STALE_TTL', default=60 * 60 * 24 * 30, cast=int),  # Served while refreshed
+    'SNAP_DECIMALS': 4,
+}
+# Background refresh of stale cache entries (refresh.py). MODE 'thread' runs them on an in-process
+# pool, 'queue' stores them for the process_refresh_queue command. QPS caps the refresh calls to Google
+CACHE_REFRESH = {
+    'MODE': config('CACHE_REFRESH_MODE', default='thread'),
+    'MAX_WORKERS': config('CACHE_REFRESH_MAX_WORKERS', default=2, cast=int),
+    'QPS': config('CACHE_REFRESH_QPS', default=5.0, cast=float),
+    'BATCH_SIZE': config('CACHE_REFRESH_BATCH_SIZE', default=20, cast=int),
+    'CLAIM_TIMEOUT': 60 * 5,
+}
+# Search planner for get_places (search.py): one Nearby Search per mapped type, merged and ranked
+PLACE_SEARCH = {
+    'MAX_CONCURRENT_SEARCHES': config('PLACE_SEARCH_MAX_CONCURRENT', default=4, cast=int),
+    'LATENCY_BUDGET_MS': config('PLACE_SEARCH_LATENCY_BUDGET_MS', default=2500, cast=int),
+    'MAX_PAGES': 3,  # Nearby Search returns at most 3 pages of 20 results
+    'PAGE_TOKEN_DELAY': 2.0,  # Seconds before Google accepts a next_page_token
+    'SCORE_WEIGHTS': {'rating': 1.0, 'popularity': 1.0, 'distance': 1.0},
+}
+# Local place catalogue: grid cell size in degrees, index reload interval and max entry age in seconds
+PLACE_CATALOGUE = {
+    'CELL_SIZE': 0.05,
+    'RELOAD_INTERVAL': config('PLACE_CATALOGUE_RELOAD_INTERVAL', default=300, cast=int),
+    'MAX_AGE': config('PLACE_CATALOGUE_MAX_AGE', default=60 * 60 * 24 * 30, cast=int),
+}
+# Place details cache. FRESHNESS is the refresh interval in seconds of each field group in place_details.py
+PLACE_DETAILS_CACHE = {
+    'BACKEND': config('PLACE_DETAILS_CACHE_BACKEND', default='memory'),
+    'TTL': 60 * 60 * 24 * 30,
+    'MAX_ENTRIES': config('PLACE_DETAILS_CACHE_MAX_ENTRIES', default=5000, cast=int),
+    'FRESHNESS': {
+        'volatile': config('PLACE_DETAILS_VOLATILE_FRESHNESS', default=60 * 60 * 6, cast=int),
+        'stable': config('PLACE_DETAILS_STABLE_FRESHNESS', default=60 * 60 * 24 * 30, cast=int),
+    },
+}
+# Precomputed itineraries (see precompute_itineraries). MAX_AGE is how long a built template
+# is served, in seconds; the command builds the LIMIT most requested shapes with MIN_REQUESTS or more.
+# Requests are counted in the DEMAND_CACHE_ALIAS cache, which the command must share with the workers
+ITINERARY_TEMPLATES = {
+    'DEMAND_CACHE_ALIAS': 'default',
+    'GEOHASH_PRECISION': config('ITINERARY_TEMPLATES_GEOHASH_PRECISION', default=5, cast=int),
+    'MAX_AGE': config('ITINERARY_TEMPLATES_MAX_AGE', default=60 * 60 * 24, cast=int),
+    'LIMIT': config('ITINERARY_TEMPLATES_LIMIT', default=100, cast=int),
+    'MIN_REQUESTS': config('ITINERARY_TEMPLATES_MIN_REQUESTS', default=5, cast=int),
+}
+# Per-user cache of the active schedule and next venue reads. Writes invalidate it in every worker
+# process, so it must be shared by them: 'django' (the CACHES above) or 'database'. Per-process
+# caches ('memory', or a 'django' alias using LocMemCache) are refused at startup
+SCHEDULE_READ_CACHE = {
+    'BACKEND': config('SCHEDULE_READ_CACHE_BACKEND', default='django'),
+    'TTL': config('SCHEDULE_READ_CACHE_TTL', default=60 * 10, cast=int),
+    'MAX_ENTRIES': config('SCHEDULE_READ_CACHE_MAX_ENTRIES', default=10000, cast=int),
+}
+# Verified JWTs and their users, cached by CachedJWTAuthentication for at most TTL seconds. 'memory'
+# entries only see invalidations (password change, blacklisting) made in their own process within TTL;
+# a shared 'django' cache makes them immediate. The 'database' backend would defeat the purpose
+JWT_AUTH_CACHE = {
+    'BACKEND': config('JWT_AUTH_CACHE_BACKEND', default='memory'),
+    'TTL': config('JWT_AUTH_CACHE_TTL', default=60 * 5, cast=int),
+    'MAX_ENTRIES': config('JWT_AUTH_CACHE_MAX_ENTRIES', default=10000, cast=int),
+}
+# Schedule history page sizes (default and the most a client may ask for) and rows read per chunk when streaming
+SCHEDULE_HISTORY = {
+    'PAGE_SIZE': config('SCHEDULE_HISTORY_PAGE_SIZE', default=20, cast=int),
+    'MAX_PAGE_SIZE': config('SCHEDULE_HISTORY_MAX_PAGE_SIZE', default=100, cast=int),
+    'STREAM_CHUNK_SIZE': config('SCHEDULE_HISTORY_STREAM_CHUNK_SIZE', default=100, cast=int),
+}
+# Per-request timing (instrumentation.py): the Server-Timing header, the exporters the timings go to
+# (PrometheusExporter, served at api/metrics/ to callers bearing METRICS_TOKEN, and/or LogExporter)
+# and the histogram buckets in seconds
+INSTRUMENTATION = {
+    'SERVER_TIMING': config('INSTRUMENTATION_SERVER_TIMING', default=True, cast=bool),
+    'EXPORTERS': config(
+        'INSTRUMENTATION_EXPORTERS',
+        default='urbanGuideBackend.instrumentation.PrometheusExporter',
+        cast=Csv(),
+    ),
+    'METRICS_TOKEN': config('INSTRUMENTATION_METRICS_TOKEN', default=''),
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+}
+# Profile picture renditions (pictures.py): longest edge in pixels per size label, encoding, the
+# largest upload accepted in pixels, the processing pool's threads and how long clients may cache them
+PROFILE_PICTURES = {
+    'SIZES': {'small': 96, 'medium': 320, 'large': 1024},
+    'FORMAT': 'WEBP',
+    'QUALITY': config('PROFILE_PICTURES_QUALITY', default=80, cast=int),
+    'MAX_PIXELS': 40_000_000,
+    'MAX_WORKERS': config('PROFILE_PICTURES_MAX_WORKERS', default=2, cast=int),
+    'CACHE_MAX_AGE': 60 * 60 * 24 * 365,
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -51,6 +212,10 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'urbanGuideBackend.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 # JWT Token settings (optional: customize expiration times)
 SIMPLE_JWT = {
@@ -78,6 +243,7 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 MIDDLEWARE = [
+    'urbanGuideBackend.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -116,6 +282,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLite ignores select_for_update, and a transaction that reads before it writes fails at once
+        # with "database is locked" if another one wrote in between. IMMEDIATE transactions take the
+        # write lock when they begin, so concurrent writers queue for up to timeout seconds instead
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': config('SQLITE_TIMEOUT', default=20, cast=int),
+        },
+        # A file-backed test database: the shared in-memory one fails concurrent writers with "table is locked"
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -123,6 +300,23 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# Password hashing of registrations (accounts.py): the hashing pool's threads, how many hashes may
+# wait for it before signups get a 503, and the longest a signup waits for its hash, in seconds.
+# ITERATIONS sets the PBKDF2 cost; 0 keeps Django's default
+PASSWORD_HASHING = {
+    'ITERATIONS': config('PASSWORD_HASHING_ITERATIONS', default=0, cast=int),
+    'MAX_WORKERS': config('PASSWORD_HASHING_MAX_WORKERS', default=2, cast=int),
+    'MAX_PENDING': config('PASSWORD_HASHING_MAX_PENDING', default=32, cast=int),
+    'TIMEOUT': config('PASSWORD_HASHING_TIMEOUT', default=10, cast=float),
+}
+PASSWORD_HASHERS = [
+    'urbanGuideBackend.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
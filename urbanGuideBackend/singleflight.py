@@ -0,0 +1,114 @@
+import asyncio
+import copy
+import threading
+import time
+import weakref
+
+from django.core.cache import caches
+
+from urbanGuideBackend import settings
+
+# Request coalescing: concurrent identical calls share one execution instead
+# of each sending its own upstream request. Used by google_client so a burst
+# of users opening the same place costs a single Google call.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time in this process; callers that
+    arrive while it runs wait for it and get the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, on_shared=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if on_shared is not None:
+                on_shared()
+            call.done.wait()
+            if call.error is not None:
+                # A copy per waiter, so threads don't pile frames onto one shared traceback
+                raise copy.copy(call.error) from call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    Async variant of SingleFlight for calls made on the same event loop.
+    """
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, func, on_shared=None):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        if task is None:
+            task = calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: calls.pop(key, None))
+        elif on_shared is not None:
+            on_shared()
+        # Shielded so a caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+
+def shared_call(key, func):
+    """
+    Coalesces func across worker processes through a lock in Django's cache:
+    the process holding the lock calls func and publishes the result for
+    RESULT_TTL seconds, the others poll for it. If the holder fails or takes
+    longer than LOCK_TIMEOUT, waiters make the call themselves.
+    """
+    options = settings.SINGLE_FLIGHT
+    cache = caches[options['CACHE_ALIAS']]
+    lock_key = f"singleflight:lock:{key}"
+    result_key = f"singleflight:result:{key}"
+
+    shared = cache.get(result_key)
+    if shared is not None:
+        return shared
+    if cache.add(lock_key, 1, options['LOCK_TIMEOUT']):
+        try:
+            result = func()
+            cache.set(result_key, result, options['RESULT_TTL'])
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + options['LOCK_TIMEOUT']
+    while time.monotonic() < deadline:
+        time.sleep(options['POLL_INTERVAL'])
+        # The lock is read first: the holder publishes before releasing it
+        lock_held = cache.get(lock_key) is not None
+        shared = cache.get(result_key)
+        if shared is not None:
+            return shared
+        if not lock_held:
+            break
+    return func()
@@ -0,0 +1,782 @@
+import io
+import json
+import posixpath
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from urbanGuideBackend import async_views, authentication, catalogue, google_client, itinerary_templates, pictures, places, refresh, renderers, schedules, search, settings, travel_times, views
+from urbanGuideBackend.cache import AmortizedFileBasedCache, DjangoCacheBackend, ResponseCache, is_process_local
+from urbanGuideBackend.geo import geohash_center, geohash_encode
+from urbanGuideBackend.models import CachedEntry, ItineraryTemplate, KnownPlace, RefreshTask, ScheduleVenue, UserProfile, UserSchedule
+
+
+# Tests never touch the configured (on-disk, shared) cache
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'urbanGuideBackend-tests'}}
+
+
+def venue_items(count):
+    return [
+        {"type": "venue", "name": f"Venue {n}", "place_id": f"place-{n}", "visit_start_time": None, "visit_end_time": None}
+        for n in range(count)
+    ]
+
+
+def run_concurrently(target, threads=8, calls=10):
+    """
+    Calls target(thread, call) from threads threads at once and returns the
+    exceptions raised.
+    """
+    errors = []
+    start = threading.Barrier(threads)
+
+    def work(thread):
+        start.wait()
+        try:
+            for call in range(calls):
+                try:
+                    target(thread, call)
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return errors
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentScheduleWriteTests(TransactionTestCase):
+    # Writers on other threads, so their transactions really overlap
+
+    def setUp(self):
+        self.user = User.objects.create_user('traveller', password='password')
+        schedules.create_schedule(self.user, "Trip", venue_items(4))
+
+    def test_concurrent_visit_events(self):
+        def check_in(thread, call):
+            schedules.apply_visit_events(self.user, [
+                {"type": "check_in", "venue_name": f"Venue {call % 4}", "time": f"{thread}-{call}"},
+            ])
+
+        self.assertEqual(run_concurrently(check_in), [])
+        self.assertFalse(ScheduleVenue.objects.filter(visit_start_time=None).exists())
+
+    def test_concurrent_creates(self):
+        def create(thread, call):
+            schedules.create_schedule(self.user, f"Trip {thread}-{call}", venue_items(4))
+
+        self.assertEqual(run_concurrently(create), [])
+        self.assertEqual(UserSchedule.objects.filter(user=self.user).count(), 81)
+        self.assertEqual(UserSchedule.objects.filter(user=self.user, is_active=True).count(), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ScheduleProgressTests(TestCase):
+    # The next venue pointer and progress counters kept on UserSchedule
+
+    def setUp(self):
+        self.user = User.objects.create_user('traveller', password='password')
+
+    def schedule(self):
+        return UserSchedule.objects.select_related('next_venue').get(user=self.user, is_active=True)
+
+    def check_out(self, *names):
+        schedules.apply_visit_events(self.user, [{"type": "check_out", "venue_name": name} for name in names])
+
+    def test_progress_follows_visits(self):
+        schedules.create_schedule(self.user, "Trip", venue_items(3))
+        schedule = self.schedule()
+        self.assertEqual((schedule.next_venue.name, schedule.venue_count, schedule.visited_count), ("Venue 0", 3, 0))
+
+        # Checked out out of order: the first venue not checked out is next
+        self.check_out("Venue 1")
+        schedule = self.schedule()
+        self.assertEqual((schedule.next_venue.name, schedule.visited_count), ("Venue 0", 1))
+        self.check_out("Venue 0")
+        # One join loads the pointer; answering from it takes no further query
+        schedule = self.schedule()
+        with self.assertNumQueries(0):
+            self.assertEqual(schedules.get_next_venue(schedule)["name"], "Venue 2")
+
+        self.check_out("Venue 2")
+        schedule = self.schedule()
+        self.assertEqual((schedule.next_venue, schedule.visited_count), (None, 3))
+        self.assertIsNone(schedules.get_next_venue(schedule))
+
+    def test_untracked_schedules_are_computed_once(self):
+        # Created before the venue rows and counters existed
+        items = venue_items(2)
+        items[0]["visit_end_time"] = "2024-05-01T10:00:00"
+        UserSchedule.objects.create(user=self.user, schedule=items, is_active=True)
+
+        self.assertEqual(schedules.get_next_venue(self.schedule())["name"], "Venue 1")
+        schedule = self.schedule()
+        self.assertEqual((schedule.venue_count, schedule.visited_count), (2, 1))
+        with self.assertNumQueries(0):
+            schedules.get_next_venue(schedule)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ScheduleEndpointQueryTests(TestCase):
+    # Query counts of the schedule endpoints, so a query added per venue or per request shows up here
+
+    def setUp(self):
+        # Primary keys are reused once a test's transaction rolls back, so no cached read may outlive it
+        schedules.schedule_read_cache.clear()
+        self.user = User.objects.create_user('traveller', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule = schedules.create_schedule(self.user, "Trip", venue_items(3))
+
+    def post(self, path, body):
+        # Commit callbacks run, so the reads after a write see it
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(path, body, format='json')
+
+    def test_create_schedule(self):
+        # Savepoint, deactivation, schedule insert, one insert for every venue row, progress update, release
+        with self.assertNumQueries(6):
+            response = self.post('/api/schedule/create/', {"title": "Next trip", "schedule": venue_items(8)})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(str(UserSchedule.objects.get(is_active=True).schedule_id), response.json()["schedule_id"])
+        self.assertEqual(ScheduleVenue.objects.filter(schedule__is_active=True).count(), 8)
+
+    def test_get_active_schedule(self):
+        # The schedule and its venue rows, then nothing until the next write
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/schedule/get_active_schedule/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["schedule"]), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/schedule/get_active_schedule/').json(), response.json())
+
+    def test_get_next_venue(self):
+        # The schedule joined with its next venue row
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/schedule/get_next_venue/')
+        self.assertEqual(response.json()["next_venue"]["name"], "Venue 0")
+        with self.assertNumQueries(0):
+            self.client.get('/api/schedule/get_next_venue/')
+
+    def test_start_visit(self):
+        # Savepoint, schedule, venue rows, one update of the visited rows, progress update, release
+        with self.assertNumQueries(6):
+            response = self.post('/api/schedule/check_in/', {"venue_name": "Venue 1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(ScheduleVenue.objects.get(name="Venue 1").visit_start_time)
+        self.assertEqual(self.client.get('/api/schedule/get_next_venue/').json()["next_venue"]["name"], "Venue 0")
+
+    def test_end_visit(self):
+        with self.assertNumQueries(6):
+            response = self.post('/api/schedule/check_out/', {"venue_name": "Venue 0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/schedule/get_next_venue/').json()["next_venue"]["name"], "Venue 1")
+
+    def test_visit_of_unknown_schedule(self):
+        response = self.post('/api/schedule/check_in/', {
+            "venue_name": "Venue 0",
+            "schedule_id": "00000000-0000-0000-0000-000000000000",
+        })
+        self.assertEqual(response.status_code, 404)
+
+
+class StubResponse:
+    # Stands in for a requests.Response of the Google API
+
+    def __init__(self, payload, status_code=200):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+def nearby_payload(status="OK", count=2):
+    return {"status": status, "results": [
+        {"place_id": f"place-{n}", "name": f"Place {n}", "types": ["museum"],
+         "geometry": {"location": {"lat": 44.43 + n * 0.001, "lng": 26.1}}}
+        for n in range(count)
+    ]}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ResponseCacheTests(TestCase):
+
+    def caches(self, **options):
+        for backend in ('memory', 'database', 'django'):
+            with self.subTest(backend=backend):
+                cache = ResponseCache(f'test_{backend}', {'BACKEND': backend, 'TTL': 60, 'MAX_ENTRIES': 2, **options})
+                cache.clear()
+                yield cache
+
+    def test_get_and_set(self):
+        for cache in self.caches():
+            self.assertIsNone(cache.get('key'))
+            cache.set('key', {"results": [1, 2]})
+            self.assertEqual(cache.get('key'), {"results": [1, 2]})
+            cache.set_many({'a': 1, 'b': 2})
+            self.assertEqual(cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2})
+            cache.delete('a')
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.stats.as_dict()["hits"], 3)
+
+    def test_expired_entries_are_misses(self):
+        for cache in self.caches():
+            cache.set('key', "value", ttl=0)
+            self.assertIsNone(cache.get('key'))
+
+    def test_stale_entries(self):
+        for cache in self.caches(STALE_TTL=60):
+            cache.set('key', "value", ttl=0)
+            self.assertIsNone(cache.get('key'))
+            self.assertEqual(cache.get_stale('key'), ("value", True))
+            cache.set('key', "fresh")
+            self.assertEqual(cache.get_stale('key'), ("fresh", False))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for cache in self.caches():
+            if isinstance(cache.backend, DjangoCacheBackend):
+                continue  # Eviction is left to Django's cache
+            cache.set('a', 1)
+            cache.set('b', 2)
+            cache.get('a')
+            cache.set('c', 3)
+            self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+    def test_process_local_backends(self):
+        self.assertTrue(is_process_local(ResponseCache('test_local', {'BACKEND': 'memory'}).backend))
+        self.assertFalse(is_process_local(ResponseCache('test_shared', {'BACKEND': 'database'}).backend))
+        # A 'django' backend is as shared as the cache its alias points at
+        backend = ResponseCache('test_django', {'BACKEND': 'django'}).backend
+        self.assertTrue(is_process_local(backend))
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+                self.assertFalse(is_process_local(backend))
+
+    def test_file_cache_size_is_checked_every_cull_interval_writes(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = AmortizedFileBasedCache(location, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 0, 'CULL_INTERVAL': 3}})
+            with mock.patch.object(cache, 'clear') as cleared:
+                with mock.patch.object(cache, '_list_cache_files', wraps=cache._list_cache_files) as listed:
+                    for n in range(6):
+                        cache.set(f'key-{n}', n)
+            # Checked before the third write (2 entries) and the sixth (5 entries, past MAX_ENTRIES)
+            self.assertEqual(listed.call_count, 2)
+            cleared.assert_called_once()
+
+    def test_database_entries_are_counted_every_evict_interval_writes(self):
+        cache = ResponseCache('test_database', {'BACKEND': 'database', 'MAX_ENTRIES': 300})
+        self.assertEqual(cache.backend.evict_interval, 3)
+        with CaptureQueriesContext(connection) as queries:
+            cache.set('a', 1)
+            cache.set('b', 2)
+            cache.set_many({'c': 3, 'd': 4})
+        self.assertEqual(len([query for query in queries if 'COUNT(' in query['sql']]), 1)
+
+    def test_database_entries_are_namespaced(self):
+        first = ResponseCache('test_first', {'BACKEND': 'database'})
+        second = ResponseCache('test_second', {'BACKEND': 'database'})
+        first.set('key', 1)
+        second.set('key', 2)
+        self.assertEqual((first.get('key'), second.get('key')), (1, 2))
+        first.clear()
+        self.assertEqual(list(CachedEntry.objects.values_list('namespace', flat=True)), ['test_second'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NearbySearchCacheTests(TestCase):
+    # places.search_nearby against a stubbed Google session: no network access
+
+    def setUp(self):
+        places.nearby_search_cache.clear()
+        self.cell = geohash_encode(44.4268, 26.1025, 6)
+        self.responses = []
+        patcher = mock.patch.object(google_client._session, 'get', side_effect=self.google)
+        self.upstream = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def google(self, url, params=None, **kwargs):
+        return self.responses.pop(0) if self.responses else StubResponse(nearby_payload())
+
+    def test_searches_in_one_cell_share_the_upstream_call(self):
+        cell_lat, cell_lng = geohash_center(self.cell)
+        first = places.search_nearby(44.4268, 26.1025, 1000, 'museum')
+        second = places.search_nearby(cell_lat, cell_lng, 1000, 'museum')
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.upstream.call_count, 1)
+        # Google is asked about the cell, not the user's position
+        self.assertEqual(self.upstream.call_args.kwargs['params']['location'], f"{cell_lat},{cell_lng}")
+
+    def test_other_keywords_radii_and_cells_are_separate_entries(self):
+        places.search_nearby(44.4268, 26.1025, 1000, 'museum')
+        places.search_nearby(44.4268, 26.1025, 1000, 'park')
+        places.search_nearby(44.4268, 26.1025, 2000, 'museum')
+        places.search_nearby(44.5, 26.2, 1000, 'museum')
+        self.assertEqual(self.upstream.call_count, 4)
+
+    def test_only_successful_answers_are_cached(self):
+        self.responses = [
+            StubResponse({"status": "REQUEST_DENIED", "results": []}),
+            StubResponse(nearby_payload(status="ZERO_RESULTS", count=0)),
+        ]
+        self.assertEqual(places.search_nearby(44.4268, 26.1025, 1000, 'museum')[1]["status"], "REQUEST_DENIED")
+        self.assertEqual(places.search_nearby(44.4268, 26.1025, 1000, 'museum')[1]["status"], "ZERO_RESULTS")
+        self.assertEqual(places.search_nearby(44.4268, 26.1025, 1000, 'museum')[1]["status"], "ZERO_RESULTS")
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_stale_pages_are_served_while_refreshed(self):
+        key, _ = places._nearby_query(44.4268, 26.1025, 1000, 'museum', 0, None)
+        places.nearby_search_cache.set(key, nearby_payload(count=1), ttl=0)
+
+        with mock.patch.object(places, 'request_refresh') as request_refresh:
+            status_code, payload = places.search_nearby(44.4268, 26.1025, 1000, 'museum')
+
+        self.assertEqual((status_code, len(payload["results"])), (200, 1))
+        self.assertEqual(self.upstream.call_count, 0)
+        cell_lat, cell_lng = geohash_center(self.cell)
+        request_refresh.assert_called_once_with('nearby_search', [cell_lat, cell_lng, 1000, 'museum'])
+
+    def stale_reads_from_two_users_in_the_cell(self):
+        key, _ = places._nearby_query(44.4268, 26.1025, 1000, 'museum', 0, None)
+        places.nearby_search_cache.set(key, nearby_payload(count=1), ttl=0)
+        places.search_nearby(44.4268, 26.1025, 1000, 'museum')
+        cell_lat, cell_lng = geohash_center(self.cell)
+        places.search_nearby(cell_lat + 0.0005, cell_lng - 0.0005, 1000, 'museum')
+
+    def test_stale_reads_in_one_cell_queue_one_refresh(self):
+        with mock.patch.dict(settings.CACHE_REFRESH, MODE='queue'):
+            self.stale_reads_from_two_users_in_the_cell()
+        self.assertEqual(RefreshTask.objects.count(), 1)
+        self.assertEqual(self.upstream.call_count, 0)
+
+    def test_stale_reads_in_one_cell_run_one_refresh(self):
+        worker = refresh.RefreshWorker(1, refresh.RateLimiter(0))
+        release = threading.Event()
+        with mock.patch.object(refresh, 'worker', worker), mock.patch.object(places, 'refresh_nearby', side_effect=lambda *args: release.wait(5)) as refresh_nearby:
+            # The first refresh is still running when the second user reads the stale page
+            self.stale_reads_from_two_users_in_the_cell()
+            release.set()
+            worker._executor.shutdown()
+        refresh_nearby.assert_called_once()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogueTests(TestCase):
+    # The in-memory catalogue index, starting empty in every test
+
+    def setUp(self):
+        patcher = mock.patch.multiple(catalogue, place_index=catalogue.PlaceIndex(settings.PLACE_CATALOGUE['CELL_SIZE']), _loaded_at=None, _loaded_since=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self):
+        return {place["place_id"]: place["name"] for place in catalogue.find_candidates(44.43, 26.1, 1000, ['museum'], 10)}
+
+    def store(self, place_id, name):
+        # As recorded by another worker process: in the database, not in this process's index
+        return KnownPlace.objects.create(place_id=place_id, name=name, lat=44.43, lng=26.1, tags=['museum'])
+
+    def test_reloads_only_read_places_changed_since_the_last_load(self):
+        self.store('first', "First")
+        self.assertEqual(self.names(), {'first': "First"})
+
+        self.store('second', "Second")
+        # Changed long before the last load, so not read again
+        KnownPlace.objects.filter(place_id='first').update(name="Renamed", updated_at=timezone.now() - timedelta(hours=1))
+        with mock.patch.dict(settings.PLACE_CATALOGUE, RELOAD_INTERVAL=0):
+            self.assertEqual(self.names(), {'first': "First", 'second': "Second"})
+
+    def test_reloads_do_not_wait_for_one_in_progress(self):
+        self.names()
+        with mock.patch.dict(settings.PLACE_CATALOGUE, RELOAD_INTERVAL=0), catalogue._load_lock:
+            with self.assertNumQueries(0):
+                self.names()
+
+    def test_details_update_the_live_index(self):
+        catalogue.record_search_results([
+            {"place_id": "place", "name": "Old name", "geometry": {"location": {"lat": 44.43, "lng": 26.1}}},
+        ], ['museum'])
+        self.assertEqual(self.names(), {'place': "Old name"})
+        # Seen before the next reload
+        catalogue.record_place_details("place", {"name": "New name", "rating": 4.5})
+        self.assertEqual(self.names(), {'place': "New name"})
+        self.assertEqual(KnownPlace.objects.get().name, "New name")
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PlaceSearchTests(TestCase):
+    # search.find_places with a fresh catalogue index and stubbed Nearby Searches
+
+    def setUp(self):
+        patcher = mock.patch.multiple(catalogue, place_index=catalogue.PlaceIndex(settings.PLACE_CATALOGUE['CELL_SIZE']), _loaded_at=None, _loaded_since=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, place_type, count):
+        catalogue.record_search_results([
+            {"place_id": f"{place_type}-{n}", "name": f"{place_type} {n}", "types": [place_type], "user_ratings_total": n,
+             "geometry": {"location": {"lat": 44.43 + n * 0.001, "lng": 26.1}}}
+            for n in range(count)
+        ], [place_type])
+
+    def find_places(self, place_types, limit):
+        payload = {"status": "OK", "results": [
+            {"place_id": "searched", "name": "Searched", "geometry": {"location": {"lat": 44.43, "lng": 26.1}}},
+        ]}
+        with mock.patch.object(search, 'search_nearby', return_value=(200, payload)) as search_nearby:
+            status_code, payload = search.find_places(44.43, 26.1, 1000, place_types, limit)
+        self.assertEqual(status_code, 200)
+        return [place["place_id"] for place in payload["results"]], [call.args[3] for call in search_nearby.call_args_list]
+
+    def test_catalogue_answers_when_every_type_has_its_share(self):
+        self.record('museum', 3)
+        self.record('park', 3)
+        place_ids, searched = self.find_places(['museum', 'park'], 6)
+        self.assertEqual(len(place_ids), 6)
+        self.assertEqual(searched, [])
+
+    def test_only_short_types_are_searched(self):
+        # Plenty of museums, but no parks: the parks are still searched for
+        self.record('museum', 8)
+        place_ids, searched = self.find_places(['museum', 'park'], 8)
+        self.assertEqual(searched, ['park'])
+        self.assertIn("searched", place_ids)
+        self.assertEqual(len([place_id for place_id in place_ids if place_id.startswith('museum')]), 4)
+
+
+class TravelTimeCacheTests(SimpleTestCase):
+    # travel_times.get_travel_times with the Distance Matrix calls stubbed
+
+    a, b, c, d = ({"lat": 44.43, "lng": 26.1 + n * 0.01} for n in range(4))
+
+    def setUp(self):
+        travel_times.travel_time_cache.clear()
+        self.answers = []
+        self.fetched = []
+        patcher = mock.patch.object(travel_times, '_fetch_legs', side_effect=self.fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, origins, destinations, travel_mode):
+        self.fetched.extend(zip(origins, destinations))
+        return self.answers.pop(0) if self.answers else [f"{origin['lng']:.2f} {travel_mode}" for origin in origins]
+
+    def test_only_missing_legs_are_fetched(self):
+        self.assertEqual(travel_times.get_travel_times([self.a, self.b, self.c], 'walking'), ["26.10 walking", "26.11 walking"])
+        self.assertEqual(
+            travel_times.get_travel_times([self.a, self.b, self.c, self.d], 'walking'),
+            ["26.10 walking", "26.11 walking", "26.12 walking"],
+        )
+        self.assertEqual(self.fetched, [(self.a, self.b), (self.b, self.c), (self.c, self.d)])
+        # The same pair with another travel mode is another leg
+        travel_times.get_travel_times([self.a, self.b], 'driving')
+        self.assertEqual(len(self.fetched), 4)
+
+    def test_legs_are_keyed_by_snapped_coordinates(self):
+        travel_times.get_travel_times([self.a, self.b], 'walking')
+        nearby = {"lat": self.a["lat"] + 0.00002, "lng": self.a["lng"] - 0.00002}
+        self.assertEqual(travel_times.get_travel_times([nearby, self.b], 'walking'), ["26.10 walking"])
+        self.assertEqual(self.fetched, [(self.a, self.b)])
+
+    def test_failed_legs_are_fetched_again(self):
+        self.answers = [["Unknown"]]
+        self.assertEqual(travel_times.get_travel_times([self.a, self.b], 'walking'), ["Unknown"])
+        self.assertEqual(travel_times.get_travel_times([self.a, self.b], 'walking'), ["26.10 walking"])
+        self.assertEqual(len(self.fetched), 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ItineraryTemplateTests(TestCase):
+    shape = (44.4268, 26.1025, 5000, ['museum'], 'walking', 3)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def store_template(self, venues):
+        key = itinerary_templates.template_key(*self.shape)
+        itinerary = []
+        for n, (lat, lng) in enumerate(venues):
+            if n:
+                itinerary.append({"type": "travel", "from": f"Venue {n - 1}", "to": f"Venue {n}", "travel_mode": "walking", "travel_time": "5 mins"})
+            itinerary.append({
+                "type": "venue", "place_id": f"place-{n}", "name": f"Venue {n}", "location": {"lat": lat, "lng": lng},
+                "distance": None, "start_time": None, "end_time": None, "visit_start_time": None, "visit_end_time": None,
+            })
+        return ItineraryTemplate.objects.create(**key, itinerary=itinerary, built_at=timezone.now())
+
+    def test_lookups_count_demand_without_writing(self):
+        self.assertIsNone(itinerary_templates.find_template(*self.shape))
+        template = ItineraryTemplate.objects.get()
+        self.assertEqual(template.request_count, 1)
+
+        for _ in range(3):
+            with self.assertNumQueries(1):
+                self.assertIsNone(itinerary_templates.find_template(*self.shape))
+
+        itinerary_templates.flush_demand()
+        template.refresh_from_db()
+        self.assertEqual(template.request_count, 4)
+        # Counted once: the flushed requests are gone from the cache
+        itinerary_templates.flush_demand()
+        template.refresh_from_db()
+        self.assertEqual(template.request_count, 4)
+
+    def test_decay_drops_unrequested_shapes(self):
+        template = self.store_template([(44.40, 26.08)])
+        itinerary_templates.record_demand(template.pk)
+        itinerary_templates.decay_demand()
+        self.assertFalse(ItineraryTemplate.objects.exists())
+        self.assertIsNone(caches['default'].get(itinerary_templates._demand_key(template.pk)))
+
+    def test_served_templates_start_near_the_user(self):
+        # Stored in the order planned from the cell centre: the venue next to the user comes last
+        self.store_template([(44.388, 26.08), (44.405, 26.08), (44.425, 26.08)])
+
+        with mock.patch.object(itinerary_templates, 'get_leg_times', return_value=["7 mins", "9 mins"]) as leg_times:
+            itinerary = itinerary_templates.find_template(44.428, 26.08, *self.shape[2:])
+
+        venues = [item for item in itinerary if item["type"] == "venue"]
+        self.assertEqual([venue["name"] for venue in venues], ["Venue 2", "Venue 1", "Venue 0"])
+        self.assertEqual([venue["start_time"] for venue in venues], ["09:00 AM", "10:30 AM", "12:00 AM"])
+        # Both legs now run the other way, so neither stored one applies
+        self.assertEqual([item["travel_time"] for item in itinerary if item["type"] == "travel"], ["7 mins", "9 mins"])
+        locations = [venue["location"] for venue in venues]
+        leg_times.assert_called_once_with(locations[:-1], locations[1:], 'walking')
+
+    def test_stored_legs_are_reused(self):
+        self.store_template([(44.425, 26.08), (44.405, 26.08), (44.388, 26.08)])
+
+        with mock.patch.object(google_client, 'get') as upstream:
+            itinerary = itinerary_templates.find_template(44.428, 26.08, *self.shape[2:])
+        self.assertEqual([item["travel_time"] for item in itinerary if item["type"] == "travel"], ["5 mins", "5 mins"])
+        upstream.assert_not_called()
+
+        # From the south edge of the cell the route runs backwards, and every leg is new
+        with mock.patch.object(itinerary_templates, 'get_leg_times', return_value=["7 mins", "9 mins"]) as leg_times:
+            itinerary_templates.find_template(44.386, 26.08, *self.shape[2:])
+        self.assertEqual(len(leg_times.call_args.args[0]), 2)
+
+    async def test_async_lookups_fetch_new_legs_through_the_async_client(self):
+        await sync_to_async(self.store_template)([(44.388, 26.08), (44.405, 26.08), (44.425, 26.08)])
+
+        with mock.patch.object(itinerary_templates, 'aget_leg_times', return_value=["7 mins", "9 mins"]) as leg_times:
+            with mock.patch.object(itinerary_templates, 'get_leg_times') as blocking_leg_times:
+                itinerary = await itinerary_templates.afind_template(44.428, 26.08, *self.shape[2:])
+
+        self.assertEqual([item["name"] for item in itinerary if item["type"] == "venue"], ["Venue 2", "Venue 1", "Venue 0"])
+        self.assertEqual([item["travel_time"] for item in itinerary if item["type"] == "travel"], ["7 mins", "9 mins"])
+        leg_times.assert_awaited_once()
+        blocking_leg_times.assert_not_called()
+
+    def test_venues_out_of_the_users_radius_are_dropped(self):
+        # 6.4 km from a user at the north edge of the cell, 3.6 km from its centre
+        self.store_template([(44.37, 26.08), (44.405, 26.08), (44.425, 26.08)])
+
+        with mock.patch.object(itinerary_templates, 'get_leg_times', return_value=["7 mins"]):
+            itinerary = itinerary_templates.find_template(44.428, 26.08, *self.shape[2:])
+        self.assertEqual([item["name"] for item in itinerary if item["type"] == "venue"], ["Venue 2", "Venue 1"])
+
+        # Nothing left in reach: the request falls back to a live search
+        ItineraryTemplate.objects.all().delete()
+        self.store_template([(44.37, 26.08)])
+        self.assertIsNone(itinerary_templates.find_template(44.428, 26.08, *self.shape[2:]))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PlacesEndpointTests(TestCase):
+    # The sync and async get_places views, with the search and travel times stubbed
+
+    def post(self, path, answer, body):
+        payload = nearby_payload(count=3) if answer == 200 else {"status": "REQUEST_DENIED", "error_message": "Denied"}
+        with mock.patch.object(views, 'find_template', return_value=None), \
+                mock.patch.object(async_views, 'afind_template', return_value=None), \
+                mock.patch.object(views, 'find_places', return_value=(answer, payload)), \
+                mock.patch.object(async_views, 'afind_places', return_value=(answer, payload)), \
+                mock.patch.object(views, 'get_travel_times', return_value=["5 mins", "6 mins"]), \
+                mock.patch.object(async_views, 'aget_travel_times', return_value=["5 mins", "6 mins"]):
+            return self.client.post(path, body, content_type='application/json')
+
+    def test_both_views_answer_alike(self):
+        body = {"location": "44.43,26.1", "keywords": ["Parcuri"], "max_venues": 3, "start_place_id": "place-2"}
+        for answer in (200, 403):
+            with self.subTest(answer=answer):
+                response = self.post('/api/places/', answer, body)
+                async_response = self.post('/api/async/places/', answer, body)
+                self.assertEqual(response.status_code, answer)
+                self.assertEqual((async_response.status_code, async_response.json()), (answer, response.json()))
+
+        response = self.post('/api/places/', 200, body)
+        venues = [item["place_id"] for item in response.json()["itinerary"] if item["type"] == "venue"]
+        self.assertEqual(venues[0], "place-2")
+        self.assertEqual(self.post('/api/places/', 403, body).json()["message"], "Denied")
+
+    def test_invalid_requests(self):
+        for path in ('/api/places/', '/api/async/places/'):
+            with self.subTest(path=path):
+                response = self.post(path, 200, {"location": "nowhere"})
+                self.assertEqual(response.status_code, 400)
+
+
+class RendererTests(SimpleTestCase):
+
+    def test_non_finite_floats_are_written_as_null(self):
+        data = {"distance": float('inf'), "scores": [float('nan'), 1.5]}
+        expected = {"distance": None, "scores": [None, 1.5]}
+        self.assertEqual(json.loads(renderers.dumps(data)), expected)
+        # The stdlib fallback writes the same
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(json.loads(renderers.dumps(data)), expected)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        authentication.auth_cache.clear()
+        self.user = User.objects.create_user('traveller', password='password')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.token = str(self.refresh.access_token)
+
+    def authenticate(self, token=None):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token or self.token}')
+        return authentication.CachedJWTAuthentication().authenticate(request)
+
+    def test_repeated_tokens_skip_the_user_query(self):
+        with self.assertNumQueries(1):
+            user, token = self.authenticate()
+        with self.assertNumQueries(0):
+            cached_user, cached_token = self.authenticate()
+        self.assertEqual((cached_user.pk, cached_user.username), (self.user.pk, 'traveller'))
+        self.assertEqual(cached_token['user_id'], token['user_id'])
+        # A fresh instance per request
+        self.assertIsNot(cached_user, self.authenticate()[0])
+
+    def test_invalid_tokens_are_rejected(self):
+        with self.assertRaises(InvalidToken):
+            self.authenticate(self.token[:-2])
+
+    def test_user_changes_drop_the_cached_entries(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_blacklisting_drops_the_cached_entries(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.refresh.blacklist()
+        # Validated and loaded again
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+
+@override_settings(CACHES=TEST_CACHES)
+@mock.patch.dict(settings.INSTRUMENTATION, {'METRICS_TOKEN': 'metrics-token'})
+class MetricsEndpointTests(TestCase):
+
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer metrics-token').status_code, 200)
+
+    def test_non_ascii_tokens_are_rejected(self):
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer m\u00e9trics-token')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProfilePictureTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user('traveller', password='password')
+        self.profile = UserProfile.objects.create(user=self.user, name="Traveller")
+        output = io.BytesIO()
+        Image.new('RGB', (400, 300), (200, 120, 40)).save(output, format='JPEG')
+        self.profile.userPicture.save('me.jpg', ContentFile(output.getvalue()))
+        self.original = self.profile.userPicture.name
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_build_renditions(self):
+        renditions = pictures.build_renditions(self.profile.pk, self.original)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.picture_renditions, renditions)
+        self.assertEqual(self.profile.userPicture.name, renditions['large'])
+        self.assertFalse(default_storage.exists(self.original))
+        with default_storage.open(renditions['small']) as f:
+            self.assertEqual(max(Image.open(f).size), 96)
+        response = self.client.get('/api/profile/picture/?size=small')
+        self.assertEqual(response['Location'], default_storage.url(renditions['small']))
+
+    def test_concurrent_builds_leave_one_file(self):
+        renditions = pictures.build_renditions(self.profile.pk, self.original)
+        with default_storage.open(renditions['small']) as f:
+            content = f.read()
+        storage_exists = default_storage.exists
+        checks = []
+
+        def exists(name):
+            # A second build of the same content, which checked before the first one saved
+            checks.append(name)
+            return len(checks) > 1 and storage_exists(name)
+
+        with mock.patch.object(default_storage, 'exists', side_effect=exists):
+            name = pictures._store(content)
+
+        self.assertEqual(name, renditions['small'])
+        _, files = default_storage.listdir(pictures.RENDITIONS_DIR)
+        self.assertEqual(sorted(files), sorted(set(posixpath.basename(name) for name in renditions.values())))
+
+    def test_oversized_pictures_fail_once(self):
+        with mock.patch.dict(settings.PROFILE_PICTURES, {'MAX_PIXELS': 400 * 300 - 1}):
+            with self.assertRaisesMessage(ValueError, "Picture too large"):
+                pictures.build_renditions(self.profile.pk, self.original)
+        # Pillow's own limit is left alone
+        self.assertNotEqual(Image.MAX_IMAGE_PIXELS, settings.PROFILE_PICTURES['MAX_PIXELS'])
+
+        self.profile.refresh_from_db()
+        self.assertTrue(pictures.build_failed(self.profile))
+        self.assertEqual(pictures.rendition_urls(self.profile), {})
+        with mock.patch.object(pictures, 'schedule_renditions') as schedule_renditions:
+            response = self.client.get('/api/profile/picture/?size=small')
+        # The upload is served as is, and the build isn't queued again
+        self.assertEqual(response['Location'], default_storage.url(self.original))
+        schedule_renditions.assert_not_called()
+
+    def test_pictures_are_queued_until_built(self):
+        with mock.patch.object(pictures, 'schedule_renditions') as schedule_renditions:
+            self.client.get('/api/profile/picture/?size=small')
+        schedule_renditions.assert_called_once()
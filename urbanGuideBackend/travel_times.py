@@ -0,0 +1,244 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from urbanGuideBackend import google_client, instrumentation, settings
+from urbanGuideBackend.cache import ResponseCache, make_key
+from urbanGuideBackend.geo import snap_coordinate
+from urbanGuideBackend.refresh import request_refresh
+
+# The Distance Matrix API accepts at most 100 elements per request, so a
+# single origins x destinations call can cover up to 10 consecutive legs.
+# Only its diagonal is used, but every element is billed: n legs cost n*n
+# elements batched against n with single-leg calls (DISTANCE_MATRIX_MODE).
+MAX_LEGS_PER_MATRIX = 10
+
+travel_time_cache = ResponseCache('travel_time', settings.TRAVEL_TIME_CACHE)
+
+
+def _format_location(location):
+    return f'{location["lat"]},{location["lng"]}'
+
+
+def _duration_text(element):
+    return element.get('duration', {}).get('text', 'Unknown')
+
+
+def _matrix_params(origins, destinations, travel_mode):
+    return {
+        'origins': '|'.join(_format_location(origin) for origin in origins),
+        'destinations': '|'.join(_format_location(destination) for destination in destinations),
+        'mode': travel_mode,
+        'key': settings.GOOGLE_PLACES_API_KEY,
+    }
+
+
+def _parse_matrix(result, origins, destinations):
+    """
+    Reads the legs origins[i] -> destinations[i] off the diagonal of a matrix
+    response. Returns None if the response doesn't have the expected shape.
+    """
+    rows = result.get('rows', [])
+    if result.get('status') != 'OK' or len(rows) != len(origins):
+        return None
+
+    travel_times = []
+    for i, row in enumerate(rows):
+        elements = row.get('elements', [])
+        if len(elements) != len(destinations):
+            return None
+        travel_times.append(_duration_text(elements[i]))
+    return travel_times
+
+
+def _parse_single_leg(result):
+    try:
+        return _duration_text(result['rows'][0]['elements'][0])
+    except (KeyError, IndexError):
+        return "Unknown"
+
+
+def _fetch_matrix_chunk(origins, destinations, travel_mode):
+    """
+    Fetches the legs origins[i] -> destinations[i] with a single matrix request.
+    Returns None if the batched call fails so the caller can fall back.
+    """
+    try:
+        status_code, result = google_client.get('distance_matrix', _matrix_params(origins, destinations, travel_mode))
+    except google_client.GoogleAPIUnavailable:
+        return None
+    if status_code != 200:
+        return None
+    return _parse_matrix(result, origins, destinations)
+
+
+def _fetch_single_leg(origin, destination, travel_mode):
+    try:
+        status_code, result = google_client.get('distance_matrix', _matrix_params([origin], [destination], travel_mode))
+    except google_client.GoogleAPIUnavailable:
+        return "Unknown"
+    if status_code != 200:
+        return "Unknown"
+    return _parse_single_leg(result)
+
+
+def _fetch_legs_concurrently(origins, destinations, travel_mode):
+    max_workers = min(settings.DISTANCE_MATRIX_MAX_WORKERS, len(origins))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            instrumentation.bind(lambda leg: _fetch_single_leg(leg[0], leg[1], travel_mode)),
+            zip(origins, destinations),
+        ))
+
+
+async def _afetch_matrix_chunk(origins, destinations, travel_mode):
+    try:
+        status_code, result = await google_client.aget('distance_matrix', _matrix_params(origins, destinations, travel_mode))
+    except google_client.GoogleAPIUnavailable:
+        return None
+    if status_code != 200:
+        return None
+    return _parse_matrix(result, origins, destinations)
+
+
+async def _afetch_single_leg(origin, destination, travel_mode, semaphore):
+    async with semaphore:
+        try:
+            status_code, result = await google_client.aget('distance_matrix', _matrix_params([origin], [destination], travel_mode))
+        except google_client.GoogleAPIUnavailable:
+            return "Unknown"
+    if status_code != 200:
+        return "Unknown"
+    return _parse_single_leg(result)
+
+
+async def _afetch_legs_concurrently(origins, destinations, travel_mode):
+    semaphore = asyncio.Semaphore(settings.DISTANCE_MATRIX_MAX_WORKERS)
+    return list(await asyncio.gather(*(
+        _afetch_single_leg(origin, destination, travel_mode, semaphore)
+        for origin, destination in zip(origins, destinations)
+    )))
+
+
+def _leg_key(origin, destination, travel_mode):
+    decimals = settings.TRAVEL_TIME_CACHE.get('SNAP_DECIMALS', 4)
+    return make_key(
+        snap_coordinate(origin["lat"], origin["lng"], decimals),
+        snap_coordinate(destination["lat"], destination["lng"], decimals),
+        travel_mode,
+    )
+
+
+def _chunks(origins, destinations):
+    for start in range(0, len(origins), MAX_LEGS_PER_MATRIX):
+        yield origins[start:start + MAX_LEGS_PER_MATRIX], destinations[start:start + MAX_LEGS_PER_MATRIX]
+
+
+def _fetch_legs(origins, destinations, travel_mode):
+    if settings.DISTANCE_MATRIX_MODE == 'single':
+        return _fetch_legs_concurrently(origins, destinations, travel_mode) if origins else []
+    travel_times = []
+    for chunk_origins, chunk_destinations in _chunks(origins, destinations):
+        chunk_times = _fetch_matrix_chunk(chunk_origins, chunk_destinations, travel_mode)
+        if chunk_times is None:
+            chunk_times = _fetch_legs_concurrently(chunk_origins, chunk_destinations, travel_mode)
+        travel_times.extend(chunk_times)
+    return travel_times
+
+
+async def _afetch_legs(origins, destinations, travel_mode):
+    if settings.DISTANCE_MATRIX_MODE == 'single':
+        return await _afetch_legs_concurrently(origins, destinations, travel_mode)
+
+    async def fetch_chunk(chunk_origins, chunk_destinations):
+        chunk_times = await _afetch_matrix_chunk(chunk_origins, chunk_destinations, travel_mode)
+        if chunk_times is None:
+            chunk_times = await _afetch_legs_concurrently(chunk_origins, chunk_destinations, travel_mode)
+        return chunk_times
+
+    chunk_results = await asyncio.gather(*(fetch_chunk(*chunk) for chunk in _chunks(origins, destinations)))
+    return [travel_time for chunk_times in chunk_results for travel_time in chunk_times]
+
+
+def _leg_keys(origins, destinations, travel_mode):
+    return [_leg_key(origin, destination, travel_mode) for origin, destination in zip(origins, destinations)]
+
+
+def _merge_legs(keys, cached, missing, fetched):
+    fetched_by_key = {keys[i]: travel_time for i, travel_time in zip(missing, fetched)}
+    # Failed legs are not cached so they are retried on the next itinerary
+    cacheable = {key: value for key, value in fetched_by_key.items() if value != "Unknown"}
+    return [cached.get(key) or fetched_by_key[key] for key in keys], cacheable
+
+
+def _lookup_legs(origins, destinations, keys, travel_mode):
+    """
+    Returns the cached travel times by key and the indexes of the legs to
+    fetch. Stale legs are served as they are and refreshed in the background.
+    """
+    entries = travel_time_cache.get_many_stale(keys) if keys else {}
+    cached = {key: value for key, (value, _) in entries.items()}
+    stale = [i for i, key in enumerate(keys) if key in entries and entries[key][1]]
+    if stale:
+        request_refresh('travel_times', [
+            [origins[i] for i in stale],
+            [destinations[i] for i in stale],
+            travel_mode,
+        ])
+    return cached, [i for i, key in enumerate(keys) if key not in cached]
+
+
+def refresh_legs(origins, destinations, travel_mode):
+    """
+    Refetches and caches the legs origins[i] -> destinations[i] (refresh task).
+    """
+    keys = _leg_keys(origins, destinations, travel_mode)
+    _, cacheable = _merge_legs(keys, {}, range(len(keys)), _fetch_legs(origins, destinations, travel_mode))
+    travel_time_cache.set_many(cacheable)
+
+
+def get_leg_times(origins, destinations, travel_mode):
+    """
+    Returns the travel time text of each leg origins[i] -> destinations[i].
+    Legs already in the travel time cache are served from it; only the
+    missing ones are fetched, with batched matrix requests that fall back to
+    concurrent single-leg requests on failure.
+    """
+    keys = _leg_keys(origins, destinations, travel_mode)
+
+    cached, missing = _lookup_legs(origins, destinations, keys, travel_mode)
+
+    fetched = _fetch_legs([origins[i] for i in missing], [destinations[i] for i in missing], travel_mode)
+    travel_times, cacheable = _merge_legs(keys, cached, missing, fetched)
+    travel_time_cache.set_many(cacheable)
+    return travel_times
+
+
+async def aget_leg_times(origins, destinations, travel_mode):
+    """
+    Async variant of get_leg_times.
+    """
+    keys = _leg_keys(origins, destinations, travel_mode)
+
+    cached, missing = await sync_to_async(_lookup_legs)(origins, destinations, keys, travel_mode)
+
+    fetched = await _afetch_legs([origins[i] for i in missing], [destinations[i] for i in missing], travel_mode)
+    travel_times, cacheable = _merge_legs(keys, cached, missing, fetched)
+    await sync_to_async(travel_time_cache.set_many)(cacheable)
+    return travel_times
+
+
+def get_travel_times(locations, travel_mode):
+    """
+    Returns the travel time text for each consecutive pair of locations,
+    i.e. len(locations) - 1 entries (see get_leg_times).
+    """
+    return get_leg_times(locations[:-1], locations[1:], travel_mode)
+
+
+async def aget_travel_times(locations, travel_mode):
+    """
+    Async variant of get_travel_times.
+    """
+    return await aget_leg_times(locations[:-1], locations[1:], travel_mode)
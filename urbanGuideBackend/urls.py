@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from . import views
+from . import async_views, views
 from .views import *
 from django.conf.urls.static import static
 from django.conf import settings
@@ -42,7 +42,17 @@ urlpatterns = [
     path('api/schedule/get_next_venue/', views.get_next_venue, name='get_next_venue'),
     path('api/schedule/check_in/', views.start_visit, name='start_visit'),
     path('api/schedule/check_out/', views.end_visit, name='end_visit'),
+    path('api/schedule/visits/sync/', views.sync_visits, name='sync_visits'),
     path('api/schedule/history/', views.get_schedule_history, name='get_schedule_history'),
     path('api/profile/get/', views.get_user_profile, name='get_profile'),
+    path('api/profile/picture/', views.get_profile_picture, name='get_profile_picture'),
     path('api/places/details/<str:place_id>/', views.get_place_details, name='get_place_details'),
+    path('api/cache/stats/', views.cache_stats, name='cache_stats'),
+    path('api/google/metrics/', views.google_metrics, name='google_metrics'),
+    path('api/metrics/', views.metrics, name='metrics'),
+    # Async variants of the Google-backed endpoints (serve these through asgi.py)
+    path('api/async/places/', async_views.get_places_async, name='get_places_async'),
+    path('api/async/places/details/<str:place_id>/', async_views.get_place_details_async, name='get_place_details_async'),
+    # Ahead of static() so renditions go out with their long-lived cache headers
+    path(f"{settings.MEDIA_URL.lstrip('/')}userPictures/renditions/<str:name>", views.serve_rendition, name='serve_rendition'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,22 +1,30 @@
+import hmac
 import json
-import math
 
-import requests
-from django.http import HttpResponse
-from django.utils import timezone
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from urbanGuideBackend import settings
+from urbanGuideBackend import accounts, pictures, schedules, settings
+from urbanGuideBackend.authentication import CachedJWTAuthentication
+from urbanGuideBackend.cache import get_cache_stats
+from urbanGuideBackend.google_client import get_metrics as get_google_metrics
+from urbanGuideBackend.instrumentation import render_prometheus
+from urbanGuideBackend.itinerary import assemble_itinerary, parse_places_request, places_failure, plan_venues, search_args, template_shape
+from urbanGuideBackend.itinerary_templates import find_template
 from urbanGuideBackend.models import UserProfile, UserSchedule
+from urbanGuideBackend.place_details import get_place_details as fetch_place_details, set_validators
+from urbanGuideBackend.renderers import JsonResponse, StreamingJsonResponse
+from urbanGuideBackend.search import find_places
 from urbanGuideBackend.serializers import UserProfileSerializer, UserProfileGetSerializer
+from urbanGuideBackend.travel_times import get_travel_times
 
 
 def home(request):
@@ -43,15 +51,21 @@ def register_user(request):
             {"error": "Username and password are required."},
             status=status.HTTP_400_BAD_REQUEST
         )
-    if User.objects.filter(username=username).exists():
+
+    # Create the user; the insert itself rejects taken usernames
+    try:
+        user = accounts.register(username, email, password)
+    except accounts.UsernameTaken as e:
         return Response(
-            {"error": "Username already exists."},
+            {"error": str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
-
-    # Create the user
-    user = User.objects.create_user(username=username, email=email, password=password)
-    user.save()
+    except accounts.HashingBusy:
+        return Response(
+            {"error": "Too many registrations right now, please try again shortly."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "5"},
+        )
 
     # Generate JWT tokens for the newly created user
     refresh = RefreshToken.for_user(user)
@@ -72,7 +86,9 @@ class UserProfileCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        profile = serializer.save(user=self.request.user)
+        # Resized and re-encoded off the request thread
+        pictures.schedule_renditions(profile)
 
 # Endpoint for updating an existing user profile
 class UserProfileUpdateView(generics.RetrieveUpdateAPIView):
@@ -83,181 +99,39 @@ class UserProfileUpdateView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user.userprofile
 
-# Keyword-to-Google-Places-type mapping
-KEYWORD_MAPPING = {
-    "Muzee și galerii de artă": "museum",
-    "Parcuri": "park",
-    "Grădini botanice": "botanical garden",
-    "Grădini zoologice": "zoo",
-    "Rezervații naturale": "natural feature",
-    "Monumente importante": "tourist attraction",
-    "Turnuri de observație": "point of interest",
-    "Biserici și catedrale vechi": "church",
-    "Piețe și târguri locale": "park",
-    "Centrul vechi al orașului": "neighborhood",
-    "Străzi pietonale cu arhitectură specifică": "street address",
-    "Plaje": "beach",
-    "Lacuri": "lake",
-    "Drumeții montane": "mountain",
-    "Cascade": "waterfall",
-    "Clădiri administrative sau faimoase": "point of interest",
-    "Primăria orașului": "local government office",
-    "Clădiri istorice guvernamentale": "government office",
-    "Biblioteci naționale": "library",
-    "Piețe de flori și piețe alimentare": "shopping mall",
-    "Piața centrală": "market",
-    "Bazaruri alimentare": "grocery or supermarket",
-    "Priveliști panoramice și puncte de observație": "panorama_points",
-    "Platforme de observare iluminate": "point_of_interest",
-    "Turnuri sau faruri cu vedere panoramică": "lighthouse",
-    "Poduri faimoase": "bridges",
-    "Piețe principale cu terase și cafenele": "cafe",
-    "Străzi pietonale cu artiști de stradă și târguri nocturne": "shopping_mall",
-    "Săli de operă": "opera",
-    "Teatre de comedie sau drame": "movie theater",
-    "Concerte de muzică live": "night club",
-    "Baruri pe acoperiș cu vedere panoramică": "bar",
-    "Pub-uri cu muzică live": "bar",
-    "Cluburi de noapte faimoase": "night_club",
-    "Casino-uri moderne": "casino",
-    "Baruri cu jocuri de societate": "bar",
-    "Proiecții de filme în aer liber": "movie_theater",
-    "Cinematografe nocturne drive-in": "movie_theater",
-    "Restaurante cu priveliște": "restaurant",
-    "Terase deschise pe acoperișuri sau lângă apă": "restaurant"
-}
-
+    def perform_update(self, serializer):
+        if serializer.validated_data.get('userPicture'):
+            # The old renditions belong to the replaced picture
+            profile = serializer.save(picture_renditions={})
+            pictures.schedule_renditions(profile)
+        else:
+            serializer.save()
 
 @csrf_exempt
 def get_places(request):
-    import math
-
     if request.method == "POST":
         try:
             # Parse JSON data from the POST request
-            data = json.loads(request.body)
-            location = data.get('location', '40.712776,-74.005974')  # Default to NYC
-            radius = data.get('radius', 5000)  # Default radius 5km
-            keywords = data.get('keywords', [])  # Keywords to search for
-            travel_mode = data.get('travel_mode', 'walk')  # Default travel mode: walk
-
-            # Parse user's current location (latitude, longitude)
-            user_lat, user_lng = map(float, location.split(','))
-
-            # Map keywords to Google Places types
-            place_types = [KEYWORD_MAPPING[keyword] for keyword in keywords if keyword in KEYWORD_MAPPING]
-
-            # Construct the Google Places API URL
-            url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-            params = {
-                'key': settings.GOOGLE_PLACES_API_KEY,
-                'location': location,
-                'radius': radius,
-                'keyword': place_types,
-            }
-
-            # Make the API request
-            response = requests.get(url, params=params)
-
-            if response.status_code == 200:
-                results = response.json().get('results', [])[:8]  # Limit to first 8 results
-                itinerary = []
-
-                # Helper function to calculate distance
-                def calculate_distance(lat1, lng1, lat2, lng2):
-                    # Haversine formula
-                    R = 6371  # Earth's radius in km
-                    dlat = math.radians(lat2 - lat1)
-                    dlng = math.radians(lng2 - lng1)
-                    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
-                    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-                    return R * c
-
-                # Extract relevant details, including photo_reference and calculate distances
-                enriched_results = []
-                for place in results:
-                    place_location = place.get("geometry", {}).get("location", {})
-                    place_lat = place_location.get("lat")
-                    place_lng = place_location.get("lng")
-
-                    if place_lat is not None and place_lng is not None:
-                        distance = calculate_distance(user_lat, user_lng, place_lat, place_lng)
-                    else:
-                        distance = float('inf')
-
-                    enriched_place = {
-                        "type": "venue",
-                        "place_id": place.get("place_id"),
-                        "name": place.get("name"),
-                        "location": place_location,
-                        "types": place.get("types", []),
-                        "vicinity": place.get("vicinity"),
-                        "rating": place.get("rating"),
-                        "user_ratings_total": place.get("user_ratings_total"),
-                        "distance": distance,  # Add distance
-                        "start_time": None,  # To be calculated
-                        "end_time": None,  # To be calculated
-                        "visit_start_time": None,
-                        "visit_end_time" : None
-                    }
-
-                    enriched_results.append(enriched_place)
-
-                # Sort results by distance
-                enriched_results.sort(key=lambda x: x["distance"])
-
-                # Calculate travel times between venues using the Distance Matrix API
-                for i in range(len(enriched_results) - 1):
-                    origin = enriched_results[i]["location"]
-                    destination = enriched_results[i + 1]["location"]
-
-                    # Call Distance Matrix API
-                    distance_matrix_url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-                    distance_matrix_params = {
-                        'origins': f'{origin["lat"]},{origin["lng"]}',
-                        'destinations': f'{destination["lat"]},{destination["lng"]}',
-                        'mode': travel_mode,
-                        'key': settings.GOOGLE_PLACES_API_KEY,
-                    }
-                    dm_response = requests.get(distance_matrix_url, params=distance_matrix_params)
-
-                    travel_time = "Unknown"
-                    if dm_response.status_code == 200:
-                        dm_result = dm_response.json()
-                        travel_time = dm_result['rows'][0]['elements'][0].get('duration', {}).get('text', 'Unknown')
-
-                    # Add venue
-                    itinerary.append(enriched_results[i])
-
-                    # Add travel
-                    itinerary.append({
-                        "type": "travel",
-                        "from": enriched_results[i]["name"],
-                        "to": enriched_results[i + 1]["name"],
-                        "travel_mode": travel_mode,
-                        "travel_time": travel_time,
-                    })
-
-                # Add the last venue
-                itinerary.append(enriched_results[-1])
-
-                # Assign start and end times (arbitrary estimates)
-                start_time = 9 * 60  # Start at 9:00 AM in minutes
-                for item in itinerary:
-                    if item["type"] == "venue":
-                        visit_duration = 60  # Assume 1 hour per place
-                        item["start_time"] = f"{start_time // 60:02d}:{start_time % 60:02d} AM"
-                        end_time = start_time + visit_duration
-                        item["end_time"] = f"{end_time // 60:02d}:{end_time % 60:02d} AM"
-                        start_time = end_time + 30  # Add 30 minutes for travel
-
-                return JsonResponse({'itinerary': itinerary}, safe=False)
-            else:
-                return JsonResponse({
-                    'error': 'Failed to fetch places',
-                    'status_code': response.status_code,
-                    'message': response.json().get('error_message', 'Unknown error')
-                }, status=response.status_code)
+            options = parse_places_request(json.loads(request.body))
+
+            # Serve a precomputed itinerary for this area when there is one
+            shape = template_shape(options)
+            if shape is not None:
+                itinerary = find_template(*shape)
+                if itinerary is not None:
+                    return JsonResponse({'itinerary': itinerary}, safe=False)
+
+            # Find ranked candidates in the local catalogue, then one cached Nearby Search per place type
+            status_code, payload = find_places(*search_args(options))
+            if status_code != 200:
+                return JsonResponse(places_failure(status_code, payload), status=status_code)
+
+            venues = plan_venues(payload, options)
+            # Calculate travel times between venues using the Distance Matrix API
+            travel_times = get_travel_times([venue["location"] for venue in venues], options["travel_mode"])
+            itinerary = assemble_itinerary(venues, travel_times, options["travel_mode"])
+
+            return JsonResponse({'itinerary': itinerary}, safe=False)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     else:
@@ -275,16 +149,8 @@ def create_schedule(request):
             data = json.loads(request.body)
             schedule = data.get("schedule")
             title = data.get("title", "My Trip")
-            # Mark all existing schedules as inactive
-            UserSchedule.objects.filter(user=user).update(is_active=False)
-
-            # Create a new active schedule
-            new_schedule = UserSchedule.objects.create(
-                user=user,
-                title=title,
-                schedule=schedule,
-                is_active=True,
-            )
+            # Create a new active schedule (and its venue rows), deactivating the others
+            new_schedule = schedules.create_schedule(user, title, schedule)
 
             return JsonResponse({
                 "message": "Schedule created successfully",
@@ -295,22 +161,28 @@ def create_schedule(request):
     else:
         return JsonResponse({"error": "Invalid HTTP method"}, status=405)
 @api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_active_schedule(request):
     if request.method == "GET":
         try:
             user = request.user
 
-            # Get the active schedule
-            active_schedule = UserSchedule.objects.filter(user=user, is_active=True).first()
-            if not active_schedule:
-                return JsonResponse({"error": "No active schedule found"}, status=404)
-
-            return JsonResponse({
-                "schedule_id": str(active_schedule.schedule_id),
-                "schedule": active_schedule.schedule,
-                "visited_venues": active_schedule.visited_venues,
-            })
+            def load():
+                # Get the active schedule
+                active_schedule = UserSchedule.objects.filter(user=user, is_active=True).first()
+                if not active_schedule:
+                    return 404, {"error": "No active schedule found"}
+
+                return 200, {
+                    "schedule_id": str(active_schedule.schedule_id),
+                    "schedule": schedules.build_schedule(active_schedule),
+                    "visited_venues": active_schedule.visited_venues,
+                }
+
+            # Served from the user's read cache until one of their schedules changes
+            status_code, payload = schedules.cached_read(user, "active_schedule", load)
+            return JsonResponse(payload, status=status_code)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
     else:
@@ -318,6 +190,7 @@ def get_active_schedule(request):
 
 
 @api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_next_venue(request):
     """
@@ -328,24 +201,23 @@ def get_next_venue(request):
             # Authenticate user using JWT token
             user = request.user
 
-            # Retrieve the active schedule for the user
-            active_schedule = UserSchedule.objects.filter(user=user, is_active=True).first()
-            if not active_schedule:
-                return JsonResponse({"error": "No active schedule found"}, status=404)
+            def load():
+                # Retrieve the active schedule for the user, with its next venue row
+                active_schedule = UserSchedule.objects.select_related('next_venue').filter(user=user, is_active=True).first()
+                if not active_schedule:
+                    return 404, {"error": "No active schedule found"}
 
-            # Iterate over the itinerary to find the next venue
-            for item in active_schedule.schedule:
-                if item["type"] == "venue":
-                    # Check if the venue is being visited
-                    if item["visit_start_time"] and not item["visit_end_time"]:
-                        return JsonResponse({"next_venue": item, "schedule_id" : active_schedule.schedule_id}, status=200)
+                # The next venue is kept up to date by check-ins and check-outs
+                item = schedules.get_next_venue(active_schedule)
+                if item is not None:
+                    return 200, {"next_venue": item, "schedule_id" : str(active_schedule.schedule_id)}
 
-                    # Check if the venue is unvisited
-                    if not item["visit_start_time"] and not item["visit_end_time"]:
-                        return JsonResponse({"next_venue": item, "schedule_id" : active_schedule.schedule_id}, status=200)
+                # If all venues are visited
+                return 200, {"message": "All venues have been visited."}
 
-            # If all venues are visited
-            return JsonResponse({"message": "All venues have been visited."}, status=200)
+            # Served from the user's read cache until one of their schedules changes
+            status_code, payload = schedules.cached_read(user, "next_venue", load)
+            return JsonResponse(payload, status=status_code)
 
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
@@ -363,25 +235,14 @@ def start_visit(request):
             # Parse request data
             data = json.loads(request.body)
             venue_name = data.get("venue_name")
-            start_time = data.get("start_time", timezone.now())
+            start_time = data.get("start_time")  # Defaults to now
             schedule_id = data.get("schedule_id")
 
-            # Get the schedule (active or by ID)
-            schedule = UserSchedule.objects.filter(
-                user=user,
-                schedule_id=schedule_id if schedule_id else None,
-            ).first()
-
-            if not schedule:
+            # Update the visit start time of that venue on the schedule (active or by ID)
+            event = {"type": "check_in", "venue_name": venue_name, "place_id": data.get("place_id"), "time": start_time}
+            if schedules.apply_visit_events(user, [event], schedule_id) is None:
                 return JsonResponse({"error": "No schedule found"}, status=404)
 
-            # Update the visit start time for the venue
-            for item in schedule.schedule:
-                if item["type"] == "venue" and item["name"] == venue_name:
-                    item["visit_start_time"] = start_time
-                    break
-
-            schedule.save()
             return JsonResponse({"message": "Visit started successfully"}, status=200)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
@@ -398,31 +259,49 @@ def end_visit(request):
             # Parse request data
             data = json.loads(request.body)
             venue_name = data.get("venue_name")
-            end_time = data.get("end_time", timezone.now())
+            end_time = data.get("end_time")  # Defaults to now
             schedule_id = data.get("schedule_id")
 
-            # Get the schedule (active or by ID)
-            schedule = UserSchedule.objects.filter(
-                user=user,
-                schedule_id=schedule_id if schedule_id else None,
-            ).first()
-
-            if not schedule:
+            # Update the visit end time of that venue on the schedule (active or by ID)
+            event = {"type": "check_out", "venue_name": venue_name, "place_id": data.get("place_id"), "time": end_time}
+            if schedules.apply_visit_events(user, [event], schedule_id) is None:
                 return JsonResponse({"error": "No schedule found"}, status=404)
 
-            # Update the visit start time for the venue
-            for item in schedule.schedule:
-                if item["type"] == "venue" and item["name"] == venue_name:
-                    item["visit_end_time"] = end_time
-                    break
-
-            schedule.save()
             return JsonResponse({"message": "Visit ended successfully"}, status=200)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
     else:
         return JsonResponse({"error": "Invalid HTTP method"}, status=405)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sync_visits(request):
+    """
+    Applies a batch of check-in/check-out events to one schedule at once.
+    """
+    if request.method == "POST":
+        try:
+            user = request.user
+
+            # Parse request data
+            data = json.loads(request.body)
+            events = data.get("events", [])
+            schedule_id = data.get("schedule_id")
+
+            skipped = schedules.apply_visit_events(user, events, schedule_id)
+            if skipped is None:
+                return JsonResponse({"error": "No schedule found"}, status=404)
+
+            return JsonResponse({
+                "message": "Visits synced successfully",
+                "applied": len(events) - len(skipped),
+                "skipped": skipped,
+            }, status=200)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=400)
+    else:
+        return JsonResponse({"error": "Invalid HTTP method"}, status=405)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_schedule_history(request):
@@ -430,10 +309,24 @@ def get_schedule_history(request):
         try:
             user = request.user
 
-            # Retrieve all schedules for the user
-            schedules = UserSchedule.objects.filter(user=user).values('title', 'is_active', 'created_at', 'schedule')
+            # Page through the user's schedules; full itineraries only on request
+            limit = int(request.GET.get("limit", settings.SCHEDULE_HISTORY['PAGE_SIZE']))
+            limit = max(1, min(limit, settings.SCHEDULE_HISTORY['MAX_PAGE_SIZE']))
+            include_schedule = request.GET.get("include_schedule", "").lower() in ("1", "true", "yes")
+
+            if request.GET.get("stream", "").lower() in ("1", "true", "yes"):
+                # The whole remaining history, written one schedule at a time
+                history = schedules.iter_history(user, cursor=request.GET.get("cursor"), include_schedule=include_schedule)
+                return StreamingJsonResponse(history, extra={"next_cursor": None}, status=200)
+
+            history, next_cursor = schedules.get_history(
+                user,
+                cursor=request.GET.get("cursor"),
+                limit=limit,
+                include_schedule=include_schedule,
+            )
 
-            return JsonResponse(list(schedules), safe=False, status=200)
+            return JsonResponse({"results": history, "next_cursor": next_cursor}, status=200)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
     else:
@@ -464,58 +357,22 @@ def get_user_profile(request):
 @permission_classes([IsAuthenticated])
 def get_place_details(request, place_id):
     try:
-        
-        # Get detailed place information
-        details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-        details_params = {
-            'place_id': place_id,
-            'fields': 'name,formatted_address,formatted_phone_number,rating,reviews,photos,editorial_summary,url,website,opening_hours,price_level',
-            'key': settings.GOOGLE_PLACES_API_KEY
-        }
-        
-        details_response = requests.get(details_url, params=details_params)
-        
-        if details_response.status_code != 200:
+        # Get detailed place information (cached, with per-field freshness)
+        status_code, details = fetch_place_details(place_id)
+
+        if details is None:
             return Response({
                 'error': 'Failed to fetch place details',
-                'status_code': details_response.status_code
-            }, status=details_response.status_code)
-
-        place_details = details_response.json().get('result', {})
-
-        # Get up to 5 photos
-        photo_urls = []
-        photos = place_details.get("photos", [])[:5]  # Limit to 5 photos
-        for photo in photos:
-            photo_reference = photo.get("photo_reference")
-            if photo_reference:
-                photo_url = (
-                    f"https://maps.googleapis.com/maps/api/place/photo"
-                    f"?maxwidth=800&photo_reference={photo_reference}&key={settings.GOOGLE_PLACES_API_KEY}"
-                )
-                photo_urls.append(photo_url)
-
-        # Format the response
-        formatted_details = {
-            "name": place_details.get("name"),
-            "formatted_address": place_details.get("formatted_address"),
-            "formatted_phone_number": place_details.get("formatted_phone_number"),
-            "rating": place_details.get("rating"),
-            "photos": photo_urls,
-            "description": place_details.get("editorial_summary", {}).get("overview"),
-            "google_maps_url": place_details.get("url"),
-            "website": place_details.get("website"),
-            "opening_hours": place_details.get("opening_hours", {}).get("weekday_text"),
-            "price_level": place_details.get("price_level"),
-            "reviews": [{
-                "author_name": review.get("author_name"),
-                "rating": review.get("rating"),
-                "text": review.get("text"),
-                "time": review.get("relative_time_description")
-            } for review in place_details.get("reviews", [])]
-        }
-
-        return Response(formatted_details, status=status.HTTP_200_OK)
+                'status_code': status_code
+            }, status=status_code)
+
+        # Answer conditional requests from clients holding the same payload
+        not_modified = get_conditional_response(
+            request,
+            etag=details['etag'],
+            last_modified=details['last_modified'],
+        )
+        return set_validators(not_modified or Response(details['formatted'], status=status.HTTP_200_OK), details)
 
     except Exception as e:
         return Response(
@@ -523,3 +380,65 @@ def get_place_details(request, place_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(get_cache_stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def google_metrics(request):
+    return Response(get_google_metrics(), status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    # Prometheus scrape endpoint; disabled unless INSTRUMENTATION METRICS_TOKEN is set
+    token = settings.INSTRUMENTATION['METRICS_TOKEN']
+    if not token:
+        return JsonResponse({"error": "Not found"}, status=404)
+    # Compared as bytes: compare_digest rejects str holding non-ASCII characters with a TypeError
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+        return JsonResponse({"error": "Invalid metrics token"}, status=403)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_profile_picture(request):
+    """
+    Redirects to the user's picture at ?size= (one of PROFILE_PICTURES SIZES).
+    Until its renditions are built, redirects to the uploaded picture.
+    """
+    try:
+        profile = UserProfile.objects.filter(user=request.user).first()
+        if profile is None or not profile.userPicture:
+            return JsonResponse({"error": "No profile picture"}, status=404)
+
+        size = request.GET.get("size", "medium")
+        if size not in settings.PROFILE_PICTURES['SIZES']:
+            return JsonResponse({"error": f"Unknown size: {size}"}, status=400)
+
+        name = pictures.rendition_name(profile, size)
+        if name is None:
+            # Also retries a build lost with its worker; a build already running or failed is not repeated
+            if not pictures.build_failed(profile):
+                pictures.schedule_renditions(profile)
+            name = profile.userPicture.name
+        response = HttpResponseRedirect(default_storage.url(name))
+        # The target changes when the picture does; the rendition itself is cached for good
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+def serve_rendition(request, name):
+    # Rendition names are content hashes, so they can be cached as immutable
+    name = f"{pictures.RENDITIONS_DIR}/{name}"
+    if not pictures.is_rendition(name) or not default_storage.exists(name):
+        raise Http404("No such picture")
+    response = FileResponse(default_storage.open(name, 'rb'), content_type=f"image/{settings.PROFILE_PICTURES['FORMAT'].lower()}")
+    response['Cache-Control'] = f"public, max-age={settings.PROFILE_PICTURES['CACHE_MAX_AGE']}, immutable"
+    return response